@@ -2,6 +2,9 @@ from flask import Flask
 from flask_cors import CORS
 from flask_login import LoginManager
 from app.models import db, Settings
+from app.utils.settings_cache import bump_settings_version
+from app.utils.serialization import FastJSONProvider
+from app.utils.pool_metrics import TimedQueuePool, instrument_engine
 import os
 from dotenv import load_dotenv
 from urllib.parse import quote_plus
@@ -14,6 +17,9 @@ login_manager = LoginManager()
 def create_app():
     app = Flask(__name__)
     
+    # orjson-backed JSON encoding for all responses (stdlib fallback when not installed)
+    app.json = FastJSONProvider(app)
+    
     # Get the base directory (backend folder)
     basedir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
     
@@ -45,6 +51,17 @@ def create_app():
         
         app.config['SQLALCHEMY_DATABASE_URI'] = f'postgresql+psycopg://{db_user_encoded}:{db_password_encoded}@{db_host}:{db_port}/{db_name}'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    
+    # Connection pool per worker process. Every gunicorn worker gets its own pool,
+    # so workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) must stay below Postgres max_connections
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '4')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '4')),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '10')),  # seconds to wait for a free connection
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),  # seconds before a connection is replaced
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes'),
+    }
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
     
     # Session and security config
@@ -53,6 +70,11 @@ def create_app():
     app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
     app.config['PERMANENT_SESSION_LIFETIME'] = 1800  # 30 minutes
     
+    # Per-worker cache of logged-in user identities (0 disables caching)
+    app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', '30'))  # seconds
+    app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', '1024'))
+    app.config['DASHBOARD_CACHE_TTL'] = int(os.getenv('DASHBOARD_CACHE_TTL', '60'))  # seconds
+    
     # CORS setup for frontend - support both development and production
     allowed_origins = [
         "http://localhost:5173",  # Vite dev server
@@ -68,13 +90,16 @@ def create_app():
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     
+    from app.utils.user_cache import user_cache, load_cached_user
+    user_cache.configure(ttl=app.config['USER_CACHE_TTL'], max_size=app.config['USER_CACHE_SIZE'])
+    
     @login_manager.user_loader
     def load_user(user_id):
-        from app.models import User
-        return User.query.get(int(user_id))
+        return load_cached_user(int(user_id))
     
     # Create tables and initialize default settings
     with app.app_context():
+        instrument_engine(db.engine)
         db.create_all()
         
         # Initialize default settings if not exist
@@ -89,20 +114,46 @@ def create_app():
         ]
         
         try:
+            added = False
             for key, value in default_settings:
                 existing = Settings.query.filter_by(key=key).first()
                 if not existing:
                     setting = Settings(key=key, value=value)
                     db.session.add(setting)
+                    added = True
+            if added:
+                bump_settings_version()
             db.session.commit()
         except Exception as e:
             db.session.rollback()
             print(f"Settings initialization error: {e}")
+        
+        # Shared counter that versions cached patient and visit reads
+        from app.utils.data_version import ensure_data_version
+        ensure_data_version()
+        
+        # Keep the patient number sequence ahead of existing patient IDs
+        from app.utils.patient_ids import ensure_patient_id_sequence
+        ensure_patient_id_sequence()
+        
+        # Trigram indexes for patient search (falls back to ILIKE without pg_trgm)
+        from app.utils.search import ensure_trigram_indexes
+        ensure_trigram_indexes()
+        
+        # Indexes added since release (create_all skips them on existing tables)
+        from app.utils.indexes import ensure_indexes
+        ensure_indexes()
+        
+        # Dashboard rollups for databases that predate them
+        from app.utils.rollups import ensure_rollups
+        ensure_rollups()
     
     # Register blueprints
-    from app.routes import auth, patients, visits, analytics, reports, settings, users
+    from app.routes import auth, patients, visits, analytics, reports, settings, users, sync, export
     from app.routes.health import health_bp
     
+    analytics.dashboard_cache.configure(ttl=app.config['DASHBOARD_CACHE_TTL'])
+    
     app.register_blueprint(auth.bp)
     app.register_blueprint(patients.bp)
     app.register_blueprint(visits.bp)
@@ -110,6 +161,8 @@ def create_app():
     app.register_blueprint(reports.bp)
     app.register_blueprint(settings.bp)
     app.register_blueprint(users.bp)
+    app.register_blueprint(sync.bp)
+    app.register_blueprint(export.bp)
     app.register_blueprint(health_bp)
     
     return app
@@ -1,9 +1,14 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.ext.hybrid import hybrid_property
+from app.utils.ages import calculate_age
 
 db = SQLAlchemy()
 
+# Source of the numeric part of Patient.patient_id (P-001, P-002, ...)
+patient_number_seq = db.Sequence('patient_number_seq', metadata=db.Model.metadata)
+
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
     
@@ -36,8 +41,9 @@ class Patient(db.Model):
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     patient_id = db.Column(db.String(20), unique=True, nullable=False, index=True)
     full_name = db.Column(db.String(200), nullable=False, index=True)
-    date_of_birth = db.Column(db.Date, nullable=False)
-    age = db.Column(db.Integer, nullable=False)
+    date_of_birth = db.Column(db.Date, nullable=False, index=True)
+    # Legacy stored age, still written for schema compatibility but never read; use Patient.age
+    stored_age = db.Column('age', db.Integer, nullable=False)
     gender = db.Column(db.String(20), nullable=False)
     contact_number = db.Column(db.String(20), nullable=False, index=True)
     email = db.Column(db.String(100))
@@ -51,13 +57,29 @@ class Patient(db.Model):
     emergency_contact_number = db.Column(db.String(20))
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)  # Nullable for migration
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     # Relationships
     visits = db.relationship('Visit', backref='patient', lazy=True, cascade='all, delete-orphan')
     creator = db.relationship('User', foreign_keys=[created_by], backref='created_patients')
     shared_access = db.relationship('PatientAccess', backref='patient', lazy=True, cascade='all, delete-orphan')
     
+    # Composite indexes backing keyset pagination of the patient list
+    __table_args__ = (
+        db.Index('ix_patients_full_name_id', 'full_name', 'id'),
+        db.Index('ix_patients_created_at_id', 'created_at', 'id'),
+    )
+    
+    @hybrid_property
+    def age(self):
+        """Current age in years, derived from date_of_birth"""
+        return calculate_age(self.date_of_birth) if self.date_of_birth else None
+    
+    @age.expression
+    def age(cls):
+        # Postgres: whole years between date_of_birth and today, usable in filters, aggregates and ORDER BY
+        return db.cast(db.func.date_part('year', db.func.age(cls.date_of_birth)), db.Integer)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -95,9 +117,14 @@ class Visit(db.Model):
     follow_up_date = db.Column(db.Date)
     doctor_notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     last_edited_at = db.Column(db.DateTime, nullable=True)
     
+    # Latest-visit lookups per patient (patient list, patient detail)
+    __table_args__ = (
+        db.Index('ix_visits_patient_id_visit_date', 'patient_id', 'visit_date'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -133,6 +160,22 @@ class Settings(db.Model):
         }
 
 
+class SettingsVersion(db.Model):
+    """Single-row counter bumped whenever settings change, so workers can revalidate cached settings"""
+    __tablename__ = 'settings_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DataVersion(db.Model):
+    """Single-row counter bumped by every patient and visit write, so workers can revalidate cached reads"""
+    __tablename__ = 'data_version'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+
 class PatientAccess(db.Model):
     __tablename__ = 'patient_access'
     
@@ -141,7 +184,7 @@ class PatientAccess(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
     granted_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     access_comment = db.Column(db.Text)
-    granted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    granted_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     # Relationships
     user = db.relationship('User', foreign_keys=[user_id], backref='patient_accesses')
@@ -161,3 +204,39 @@ class PatientAccess(db.Model):
             'access_comment': self.access_comment,
             'granted_at': self.granted_at.isoformat() if self.granted_at else None
         }
+
+
+class SyncTombstone(db.Model):
+    """Record of a deleted row, so delta-sync clients can drop their local copy"""
+    __tablename__ = 'sync_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entity = db.Column(db.String(20), nullable=False)  # 'patient', 'visit' or 'access'
+    entity_id = db.Column(db.Integer, nullable=False)
+    patient_id = db.Column(db.Integer, nullable=True)  # No FK: the patient may be gone too
+    user_id = db.Column(db.Integer, nullable=True)  # Grantee for access tombstones, user told for patient tombstones
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+# Analytics rollups, maintained incrementally by app.utils.rollups
+
+class DailyVisitStats(db.Model):
+    __tablename__ = 'daily_visit_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    visit_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DailyComplaintStats(db.Model):
+    __tablename__ = 'daily_complaint_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    complaint = db.Column(db.Text, primary_key=True)
+    visit_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class DailyPatientStats(db.Model):
+    __tablename__ = 'daily_patient_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    new_patients = db.Column(db.Integer, nullable=False, default=0)
@@ -1,64 +1,124 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, current_app
 from flask_login import login_required
-from app.models import db, Patient, Visit
-from datetime import datetime, timedelta
+from app.models import db, Patient, DailyVisitStats, DailyComplaintStats
+from app.utils.cache import TTLCache
+from app.utils.data_version import get_data_version
+from app.utils.pool_metrics import pool_metrics
+from app.routes.users import admin_required
+from app.utils.ages import latest_birth_date_for_age
+from datetime import date, datetime, timedelta
+import os
 
 bp = Blueprint('analytics', __name__, url_prefix='/api/analytics')
 
+# Dashboard payload cache, one per worker. Entries are keyed on the shared data
+# version, so a patient or visit write in any worker invalidates them everywhere.
+dashboard_cache = TTLCache(ttl=60, max_size=1)
+
+
 @bp.route('/dashboard', methods=['GET'])
 @login_required
 def get_dashboard():
     """Get dashboard analytics"""
     try:
-        # Total patients count
-        total_patients = Patient.query.count()
-        
-        # Top 3 complaints from last 30 days
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_visits = Visit.query.filter(Visit.visit_date >= thirty_days_ago.date()).all()
-        
-        complaint_counts = {}
-        for visit in recent_visits:
-            complaint = visit.chief_complaint
-            if complaint:
-                complaint_counts[complaint] = complaint_counts.get(complaint, 0) + 1
+        # Ages roll over at midnight, so the date is part of the key too
+        key = ('dashboard', get_data_version(), date.today())
+        payload = dashboard_cache.get(key)
+        if payload is None:
+            payload = build_dashboard()
+            dashboard_cache.set(key, payload)
+            cache_status = 'MISS'
+        else:
+            cache_status = 'HIT'
         
-        total_recent = len(recent_visits)
-        top_complaints = []
-        if total_recent > 0:
-            top_3 = sorted(complaint_counts.items(), key=lambda x: x[1], reverse=True)[:3]
-            top_complaints = [
-                {
-                    'complaint': complaint,
-                    'count': count,
-                    'percentage': round((count / total_recent) * 100, 1)
-                }
-                for complaint, count in top_3
-            ]
-        
-        # Age distribution
-        def get_age_group(age):
-            if age < 19:
-                return '0-18'
-            elif age < 36:
-                return '19-35'
-            elif age < 51:
-                return '36-50'
-            elif age < 66:
-                return '51-65'
-            else:
-                return '65+'
-        
-        patients = Patient.query.all()
-        age_distribution = {'0-18': 0, '19-35': 0, '36-50': 0, '51-65': 0, '65+': 0}
-        for patient in patients:
-            group = get_age_group(patient.age)
-            age_distribution[group] += 1
-        
-        return jsonify({
-            'total_patients': total_patients,
-            'top_complaints': top_complaints,
-            'age_distribution': age_distribution
-        }), 200
+        response = jsonify(payload)
+        response.headers['X-Cache'] = cache_status
+        return response, 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/cache-stats', methods=['GET'])
+@login_required
+def get_cache_stats():
+    """
+    Get dashboard cache hit/miss counters. The counters are per worker: each
+    gunicorn worker keeps its own cache, so this reports only the worker that
+    served the request (identified by pid).
+    """
+    return jsonify({
+        'pid': os.getpid(),
+        'scope': 'worker',
+        'dashboard': dashboard_cache.stats()
+    }), 200
+
+
+@bp.route('/pool-stats', methods=['GET'])
+@login_required
+@admin_required
+def get_pool_stats():
+    """
+    Get database connection pool usage (admin only). Each gunicorn worker has
+    its own pool and counters, so this reports only the worker that served the
+    request (identified by pid); sample repeatedly to see the others.
+    """
+    return jsonify({
+        'pid': os.getpid(),
+        'scope': 'worker',
+        'pool': pool_metrics.snapshot(db.engine.pool),
+        'max_overflow': current_app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('max_overflow'),
+        'pool_timeout': current_app.config['SQLALCHEMY_ENGINE_OPTIONS'].get('pool_timeout')
+    }), 200
+
+
+def build_dashboard():
+    """Compute the dashboard analytics payload"""
+    # Top 3 complaints from last 30 days, read from the daily rollups
+    thirty_days_ago = datetime.now() - timedelta(days=30)
+    since = thirty_days_ago.date()
+    
+    total_recent = db.session.query(
+        db.func.coalesce(db.func.sum(DailyVisitStats.visit_count), 0)
+    ).filter(DailyVisitStats.day >= since).scalar()
+    
+    top_complaints = []
+    if total_recent > 0:
+        complaint_count = db.func.sum(DailyComplaintStats.visit_count).label('count')
+        top_3 = db.session.query(DailyComplaintStats.complaint, complaint_count).filter(
+            DailyComplaintStats.day >= since
+        ).group_by(DailyComplaintStats.complaint).having(complaint_count > 0).order_by(
+            complaint_count.desc(), DailyComplaintStats.complaint
+        ).limit(3).all()
+        top_complaints = [
+            {
+                'complaint': complaint,
+                'count': count,
+                'percentage': round((count / total_recent) * 100, 1)
+            }
+            for complaint, count in top_3
+        ]
+    
+    # Age distribution, bucketed by date_of_birth cutoffs in a single grouped query
+    # (age < N is the same as date_of_birth later than the Nth-birthday cutoff)
+    today = date.today()
+    age_group = db.case(
+        (Patient.date_of_birth > latest_birth_date_for_age(19, today), '0-18'),
+        (Patient.date_of_birth > latest_birth_date_for_age(36, today), '19-35'),
+        (Patient.date_of_birth > latest_birth_date_for_age(51, today), '36-50'),
+        (Patient.date_of_birth > latest_birth_date_for_age(66, today), '51-65'),
+        else_='65+'
+    ).label('age_group')
+    age_counts = db.session.query(age_group, db.func.count(Patient.id)).group_by(age_group).all()
+    
+    age_distribution = {'0-18': 0, '19-35': 0, '36-50': 0, '51-65': 0, '65+': 0}
+    for group, count in age_counts:
+        age_distribution[group] = count
+    
+    # Every patient falls in exactly one age group
+    total_patients = sum(age_distribution.values())
+    
+    return {
+        'total_patients': total_patients,
+        'top_complaints': top_complaints,
+        'age_distribution': age_distribution
+    }
@@ -4,6 +4,7 @@ from werkzeug.security import generate_password_hash
 from datetime import datetime
 from app import db
 from app.models import User
+from app.utils.user_cache import invalidate_user
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -67,6 +68,7 @@ def login():
     # Update last login
     user.last_login = datetime.utcnow()
     db.session.commit()
+    invalidate_user(user.id)
     
     # Create session
     login_user(user, remember=False)
@@ -106,5 +108,6 @@ def change_password():
     
     current_user.password_hash = generate_password_hash(data['new_password'], method='pbkdf2:sha256')
     db.session.commit()
+    invalidate_user(current_user.id)
     
     return jsonify({'message': 'Password changed successfully'}), 200
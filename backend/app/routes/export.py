@@ -0,0 +1,115 @@
+from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
+from flask_login import login_required
+from app.models import Patient, Visit, PatientAccess
+from app.utils.access_control import get_accessible_patients_query
+from app.utils.serialization import PATIENT_COLUMNS, VISIT_COLUMNS, ACCESS_COLUMNS, PATIENT_VIEWS, patient_row_to_dict, visit_row_to_dict
+from datetime import date, datetime
+import csv
+import io
+import os
+
+bp = Blueprint('export', __name__, url_prefix='/api/export')
+
+# Rows fetched per server-side cursor round trip, and written per response chunk
+EXPORT_BATCH_SIZE = max(1, int(os.getenv('EXPORT_BATCH_SIZE', '1000')))
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _export_query(entity):
+    """
+    Build the row query for one exported table, scoped to the patients the
+    current user can access.
+    
+    Returns:
+        Tuple of (query, output field names, row-to-dict function) or None for unknown tables
+    """
+    patients = get_accessible_patients_query()
+    
+    if entity == 'patients':
+        fields = [name for name in PATIENT_VIEWS['full'] if name != 'latest_visit_date']
+        query = patients.with_entities(*PATIENT_COLUMNS).order_by(Patient.id)
+        return query, fields, patient_row_to_dict
+    
+    if entity == 'visits':
+        query = patients.join(Visit, Visit.patient_id == Patient.id).with_entities(*VISIT_COLUMNS).order_by(Visit.id)
+        return query, [column.key for column in VISIT_COLUMNS], visit_row_to_dict
+    
+    if entity == 'access':
+        query = patients.join(PatientAccess, PatientAccess.patient_id == Patient.id).with_entities(
+            *ACCESS_COLUMNS
+        ).order_by(PatientAccess.id)
+        return query, [column.key for column in ACCESS_COLUMNS], lambda row: row._mapping
+    
+    return None
+
+
+def _csv_value(value):
+    """Format a value for CSV: ISO dates (matching the JSON API) and empty cells for NULL"""
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+@bp.route('/<entity>', methods=['GET'])
+@login_required
+def export_table(entity):
+    """
+    Stream every accessible patient, visit or access grant as CSV or NDJSON.
+    
+    Rows come from a server-side cursor and are written out in chunks as they
+    are fetched, so memory use is flat and the download starts immediately.
+    """
+    try:
+        output_format = request.args.get('format', 'csv')
+        if output_format not in EXPORT_FORMATS:
+            return jsonify({'error': "format must be 'csv' or 'ndjson'"}), 400
+        
+        export = _export_query(entity)
+        if export is None:
+            return jsonify({'error': "Unknown export, expected 'patients', 'visits' or 'access'"}), 404
+        query, fields, to_dict = export
+        
+        rows = query.yield_per(EXPORT_BATCH_SIZE)
+        json_provider = current_app.json
+        
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer) if output_format == 'csv' else None
+            if writer:
+                writer.writerow(fields)
+                # Send the header right away so the download starts before the first fetch
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            
+            pending = 0
+            for row in rows:
+                data = to_dict(row)
+                if writer:
+                    writer.writerow([_csv_value(data[name]) for name in fields])
+                else:
+                    buffer.write(json_provider.dumps({name: data[name] for name in fields}))
+                    buffer.write('\n')
+                pending += 1
+                if pending == EXPORT_BATCH_SIZE:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                    pending = 0
+            if pending:
+                yield buffer.getvalue()
+        
+        filename = f"{entity}_{date.today().isoformat()}.{output_format}"
+        return Response(
+            stream_with_context(generate()),
+            mimetype=EXPORT_FORMATS[output_format],
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,56 +1,121 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from app.models import db, Patient, Visit, PatientAccess, User
-from app.utils.access_control import has_patient_access, get_accessible_patients_query, grant_patient_access, revoke_patient_access, get_patient_accessors
-from datetime import datetime
+from app.utils.access_control import has_patient_access, get_accessible_patients_query, get_accessible_patient_ids, grant_patient_access, revoke_patient_access, get_patient_accessors, invalidate_permissions
+from app.utils.ages import calculate_age
+from app.utils.patient_ids import next_patient_id
+from app.utils.rollups import record_new_patient, record_patient_deleted
+from app.utils.search import apply_patient_search
+from app.utils.sync import record_patient_tombstones
+from app.utils.bulk_import import import_records, detect_format
+from app.utils.pagination import parse_limit, encode_cursor, decode_cursor, apply_keyset
+from app.utils.serialization import (
+    PATIENT_COLUMNS, VISIT_COLUMNS, PATIENT_VIEWS, PATIENT_DERIVED_FIELDS,
+    parse_fieldset, select_columns, patient_row_to_dict, visit_row_to_dict
+)
+from app.utils.etags import compute_etag, not_modified, with_etag
+from app.utils.data_version import get_data_version, bump_data_version
+from datetime import datetime, date
 
 bp = Blueprint('patients', __name__, url_prefix='/api/patients')
 
 @bp.route('', methods=['GET'])
 @login_required
 def get_patients():
-    """List all patients with optional search and sort (only accessible patients)"""
+    """List all patients with optional search, sort, field selection and keyset pagination (only accessible patients)"""
     try:
         search = request.args.get('search', '')
-        sort_by = request.args.get('sort_by', 'name')
-        order = request.args.get('order', 'asc')
+        sort_by = request.args.get('sort_by', 'relevance' if search else 'name')
+        order = request.args.get('order')
+        fields = parse_fieldset(PATIENT_VIEWS, request.args.get('fields'), request.args.get('view'))
+        
+        # Conditional GET: every patient and visit write bumps the shared data
+        # version, so together with the accessible set it changes whenever any
+        # page of this list would (one primary-key lookup, no scan of the tables)
+        accessible_ids = get_accessible_patient_ids()
+        etag = compute_etag(
+            'patients',
+            sorted(accessible_ids) if accessible_ids is not None else None,
+            get_data_version(),
+            sorted(request.args.items(multi=True)),
+            date.today()  # ages roll over daily
+        )
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
         
         # Get only patients accessible to current user
         query = get_accessible_patients_query()
         
-        # Search filter
+        # Search filter (trigram-ranked when pg_trgm is available)
+        search_rank = None
         if search:
-            search_term = f'%{search}%'
-            query = query.filter(
-                db.or_(
-                    Patient.full_name.ilike(search_term),
-                    Patient.patient_id.ilike(search_term),
-                    Patient.contact_number.ilike(search_term)
-                )
-            )
+            query, search_rank = apply_patient_search(query, search)
         
         # Sorting
-        if sort_by == 'name':
+        if sort_by == 'relevance' and search_rank is not None:
+            sort_column = search_rank
+        elif sort_by == 'name' or sort_by == 'relevance':
+            sort_by = 'name'
             sort_column = Patient.full_name
         elif sort_by == 'id':
             sort_column = Patient.patient_id
         else:
+            sort_by = 'created_at'
             sort_column = Patient.created_at
         
-        if order == 'desc':
-            sort_column = sort_column.desc()
+        # Relevance defaults to best match first; everything else to ascending
+        if order not in ('asc', 'desc'):
+            order = 'desc' if sort_by == 'relevance' else 'asc'
+        
+        # Keyset pagination is opt-in so existing clients keep receiving a plain list
+        paginate = 'limit' in request.args or 'cursor' in request.args
+        cursor_value, cursor_id = None, None
+        if paginate:
+            limit = parse_limit(request.args.get('limit'))
+            cursor = request.args.get('cursor')
+            if cursor:
+                cursor_value, cursor_id = decode_cursor(cursor, sort_by, order)
+        
+        # Select only the requested columns (plus the sort key for the cursor) as plain rows
+        columns = select_columns(PATIENT_COLUMNS, fields, PATIENT_DERIVED_FIELDS)
+        if sort_by != 'relevance' and sort_column.key not in {column.key for column in columns}:
+            columns.append(sort_column)
+        
+        if 'latest_visit_date' in fields:
+            # Latest visit date per returned patient: a correlated lookup served by
+            # ix_visits_patient_id_visit_date, evaluated only for the rows on this page
+            latest_visit_date = db.select(db.func.max(Visit.visit_date)).where(
+                Visit.patient_id == Patient.id
+            ).correlate(Patient).scalar_subquery()
+            columns.append(latest_visit_date.label('latest_visit_date'))
+        
+        query = query.with_entities(*columns)
+        if sort_by == 'relevance':
+            query = query.add_columns(search_rank.label('search_rank'))
+        query = apply_keyset(query, sort_column, Patient.id, order, cursor_value, cursor_id)
+        
+        if paginate:
+            # Fetch one extra row to know whether another page exists
+            rows = query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+        else:
+            rows = query.all()
         
-        patients = query.order_by(sort_column).all()
+        result = [patient_row_to_dict(row, fields) for row in rows]
         
-        # Add latest visit info to each patient
-        result = []
-        for patient in patients:
-            patient_data = patient.to_dict()
-            latest_visit = Visit.query.filter_by(patient_id=patient.id).order_by(Visit.visit_date.desc()).first()
-            patient_data['latest_visit_date'] = latest_visit.visit_date.isoformat() if latest_visit else None
-            result.append(patient_data)
+        if paginate:
+            next_cursor = None
+            if has_more:
+                last_row = rows[-1]
+                last_value = last_row.search_rank if sort_by == 'relevance' else getattr(last_row, sort_column.key)
+                next_cursor = encode_cursor(sort_by, order, last_value, last_row.id)
+            return with_etag(jsonify({'patients': result, 'next_cursor': next_cursor}), etag), 200
         
-        return jsonify(result), 200
+        return with_etag(jsonify(result), etag), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -64,13 +129,33 @@ def get_patient(id):
         if not has_patient_access(id):
             return jsonify({'error': 'Access denied to this patient'}), 403
         
-        patient = Patient.query.get_or_404(id)
-        latest_visit = Visit.query.filter_by(patient_id=id).order_by(Visit.visit_date.desc()).first()
+        # Conditional GET from the patient's updated_at and its visit count/latest update
+        meta = db.session.query(
+            Patient.updated_at,
+            db.func.count(Visit.id),
+            db.func.max(Visit.updated_at)
+        ).outerjoin(Visit, Visit.patient_id == Patient.id).filter(
+            Patient.id == id
+        ).group_by(Patient.id, Patient.updated_at).first()
+        if meta is None:
+            return jsonify({'error': 'Patient not found'}), 404
         
-        return jsonify({
-            'patient': patient.to_dict(),
-            'latest_visit': latest_visit.to_dict() if latest_visit else None
-        }), 200
+        etag = compute_etag('patient', id, tuple(meta), date.today())
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        
+        patient = db.session.query(*PATIENT_COLUMNS).filter(Patient.id == id).first()
+        if patient is None:
+            return jsonify({'error': 'Patient not found'}), 404
+        latest_visit = db.session.query(*VISIT_COLUMNS).filter(
+            Visit.patient_id == id
+        ).order_by(Visit.visit_date.desc()).first()
+        
+        return with_etag(jsonify({
+            'patient': patient_row_to_dict(patient),
+            'latest_visit': visit_row_to_dict(latest_visit) if latest_visit else None
+        }), etag), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -82,26 +167,17 @@ def create_patient():
     try:
         data = request.json
         
-        # Auto-generate patient_id
-        last_patient = Patient.query.order_by(Patient.patient_id.desc()).first()
-        if last_patient:
-            last_num = int(last_patient.patient_id.split('-')[1])
-            new_patient_id = f"P-{str(last_num + 1).zfill(3)}"
-        else:
-            new_patient_id = "P-001"
+        # Auto-generate patient_id from the patient number sequence
+        new_patient_id = next_patient_id()
         
         # Parse date_of_birth
         dob = datetime.strptime(data['date_of_birth'], '%Y-%m-%d').date()
         
-        # Calculate age
-        today = datetime.now().date()
-        age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-        
         patient = Patient(
             patient_id=new_patient_id,
             full_name=data['full_name'],
             date_of_birth=dob,
-            age=age,
+            stored_age=calculate_age(dob),
             gender=data['gender'],
             contact_number=data['contact_number'],
             email=data.get('email'),
@@ -117,7 +193,11 @@ def create_patient():
         )
         
         db.session.add(patient)
+        db.session.flush()
+        record_new_patient(patient.created_at)
+        bump_data_version()
         db.session.commit()
+        invalidate_permissions(current_user.id)
         
         return jsonify(patient.to_dict()), 201
     except Exception as e:
@@ -125,6 +205,48 @@ def create_patient():
         return jsonify({'error': str(e)}), 500
 
 
+@bp.route('/import', methods=['POST'])
+@login_required
+def import_patients():
+    """
+    Bulk import patients and/or visits from multipart `patients` and `visits`
+    uploads (CSV or NDJSON) in a single transaction.
+    With errors nothing is committed unless skip_invalid=true; dry_run=true
+    only validates.
+    """
+    try:
+        patients_file = request.files.get('patients')
+        visits_file = request.files.get('visits')
+        if not patients_file and not visits_file:
+            return jsonify({'error': "Upload a 'patients' and/or 'visits' file"}), 400
+        
+        requested_format = request.form.get('format')
+        skip_invalid = request.args.get('skip_invalid', '').lower() in ('1', 'true', 'yes')
+        dry_run = request.args.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        
+        result = import_records(
+            patients=patients_file.stream if patients_file else None,
+            visits=visits_file.stream if visits_file else None,
+            patients_format=detect_format(patients_file.filename, requested_format) if patients_file else None,
+            visits_format=detect_format(visits_file.filename, requested_format) if visits_file else None,
+            created_by=current_user.id,
+            accessible_ids=get_accessible_patient_ids(),
+            skip_invalid=skip_invalid,
+            dry_run=dry_run
+        )
+        invalidate_permissions(current_user.id)
+        
+        if result['committed']:
+            return jsonify(result), 201
+        return jsonify(result), 200 if dry_run else 422
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
 @bp.route('/<int:id>', methods=['PUT'])
 @login_required
 def update_patient(id):
@@ -143,9 +265,7 @@ def update_patient(id):
         if 'date_of_birth' in data:
             dob = datetime.strptime(data['date_of_birth'], '%Y-%m-%d').date()
             patient.date_of_birth = dob
-            # Recalculate age
-            today = datetime.now().date()
-            patient.age = today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
+            patient.stored_age = calculate_age(dob)
         if 'gender' in data:
             patient.gender = data['gender']
         if 'contact_number' in data:
@@ -170,6 +290,7 @@ def update_patient(id):
             patient.emergency_contact_number = data['emergency_contact_number']
         
         patient.updated_at = datetime.utcnow()
+        bump_data_version()
         db.session.commit()
         
         return jsonify(patient.to_dict()), 200
@@ -189,8 +310,12 @@ def delete_patient(id):
         if patient.created_by != current_user.id:
             return jsonify({'error': 'Only the creator can delete this patient'}), 403
         
+        record_patient_deleted(patient)
+        record_patient_tombstones(patient)
         db.session.delete(patient)
+        bump_data_version()
         db.session.commit()
+        invalidate_permissions()
         
         return jsonify({'message': 'Patient deleted successfully'}), 200
     except Exception as e:
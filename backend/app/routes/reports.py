@@ -1,33 +1,237 @@
-from flask import Blueprint, request, send_file, jsonify
+from flask import Blueprint, request, send_file, jsonify, Response
 from flask_login import login_required
-from app.models import db, Patient, Visit, Settings
-from app.utils.pdf_generator import generate_prescription_pdf, generate_certificate_pdf, generate_patient_report_pdf
+from app.models import db, Patient, Visit
+from app.utils.settings_cache import get_versioned_settings
+from app.utils.pdf_pool import render_pdf, submit_pdf, wait_pdf, pdf_slot, with_deadline, PDF_WORKERS, PdfRendererBusy, PdfRenderTimeout
+from app.utils.access_control import has_patient_access
+from app.utils.pdf_generator import write_patient_report_pdf
+from app.utils.pdf_cache import pdf_cache_key, get_cached_pdf, render_cached_pdf
+from app.utils.etags import not_modified, with_etag
+from collections import deque
+from datetime import datetime
+from io import RawIOBase
+import os
+import shutil
+import zipfile
 
 bp = Blueprint('reports', __name__, url_prefix='/api/reports')
 
-def get_settings_dict():
-    """Helper to get all settings as dictionary"""
-    settings = Settings.query.all()
-    return {s.key: s.value for s in settings}
+# Patient reports with more visits than this are rendered from a server-side
+# cursor in batches instead of being loaded into memory up front
+REPORT_STREAMING_THRESHOLD = int(os.getenv('REPORT_STREAMING_THRESHOLD', '200'))
+REPORT_BATCH_SIZE = int(os.getenv('REPORT_BATCH_SIZE', '100'))
+# Most prescriptions printed by one batch request
+BATCH_MAX_VISITS = int(os.getenv('BATCH_MAX_VISITS', '200'))
 
 
-@bp.route('/prescription/<int:visit_id>', methods=['POST'])
+def send_cached_pdf(etag, render, download_name):
+    """
+    Serve a PDF from the content-addressed cache, rendering it on a miss.
+    GET requests whose If-None-Match matches the content key get a 304
+    without rendering or reading the file. The file is streamed from disk.
+    """
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+    
+    response = send_file(
+        render_cached_pdf(etag, render),
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=download_name,
+        etag=False,
+        conditional=False
+    )
+    return with_etag(response, etag)
+
+
+def pdf_response(kind, args, settings_version, download_name):
+    """Render a PDF in the process pool from plain dict inputs, via the PDF cache"""
+    etag = pdf_cache_key(kind, settings_version, *args)
+    return send_cached_pdf(etag, lambda output: output.write(render_pdf(kind, *args)), download_name)
+
+
+@bp.route('/prescription/<int:visit_id>', methods=['GET', 'POST'])
 @login_required
 def generate_prescription(visit_id):
     """Generate prescription PDF"""
     try:
         visit = Visit.query.get_or_404(visit_id)
         patient = Patient.query.get_or_404(visit.patient_id)
-        settings = get_settings_dict()
+        settings_version, settings = get_versioned_settings()
+        
+        return pdf_response(
+            'prescription',
+            (visit.to_dict(), patient.to_dict(), settings),
+            settings_version,
+            f'prescription_{patient.patient_id}_{visit.visit_date}.pdf'
+        )
+    except PdfRendererBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except PdfRenderTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+class _ZipChunkSink(RawIOBase):
+    """Write-only stream collecting zipfile output so it can be yielded in chunks"""
+    
+    def __init__(self):
+        self.chunks = []
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _stream_prescriptions_zip(entries, settings_version):
+    """
+    Yield a ZIP of prescriptions chunk by chunk, in order.
+    
+    Each PDF goes through the PDF cache (so reprints of single prescriptions
+    and earlier batches are reused) and is copied into the archive from disk.
+    Renders are queued at most PDF_WORKERS entries ahead. Once the response has
+    started its status can no longer change, so a later failure ends the
+    archive with an ERRORS.txt entry naming what was left out.
+    
+    Args:
+        entries: Iterable of (file name, (visit dict, patient dict, settings))
+        settings_version: Version the settings were read at
+    """
+    entries = iter(entries)
+    pending = deque()
+    sink = _ZipChunkSink()
+    written = 0
+    
+    def queue_next():
+        entry = next(entries, None)
+        if entry is None:
+            return False
+        name, args = entry
+        key = pdf_cache_key('prescription', settings_version, *args)
+        future = None if get_cached_pdf(key) else submit_pdf('prescription', *args)
+        pending.append((name, key, args, future))
+        return True
+    
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        try:
+            while len(pending) < max(1, PDF_WORKERS) and queue_next():
+                pass
+            while pending:
+                name, key, args, future = pending.popleft()
+                
+                def render(output):
+                    output.write(wait_pdf(future) if future is not None else render_pdf('prescription', *args))
+                
+                pdf = render_cached_pdf(key, render)
+                with archive.open(name, 'w') as target, (open(pdf, 'rb') if isinstance(pdf, str) else pdf) as source:
+                    shutil.copyfileobj(source, target)
+                written += 1
+                queue_next()
+                yield sink.drain()
+        except Exception as e:
+            for _, _, _, future in pending:
+                if future is not None:
+                    future.cancel()
+            if not written:
+                raise
+            remaining = len(pending) + sum(1 for _ in entries)
+            archive.writestr('ERRORS.txt', (
+                f"Stopped after {written} prescriptions: {e}\n"
+                f"{remaining + 1} prescriptions are missing from this archive.\n"
+            ))
+    yield sink.drain()
+
+
+@bp.route('/prescriptions', methods=['POST'])
+@login_required
+def generate_prescriptions_batch():
+    """Generate prescriptions for many visits (by date or id list) as one PDF or a streamed ZIP"""
+    try:
+        data = request.json or {}
+        visit_ids = data.get('visit_ids')
+        visit_date = data.get('date')
+        output_format = data.get('format', 'pdf')
         
-        pdf_buffer = generate_prescription_pdf(visit.to_dict(), patient.to_dict(), settings)
+        if output_format not in ('pdf', 'zip'):
+            return jsonify({'error': "format must be 'pdf' or 'zip'"}), 400
+        if not visit_ids and not visit_date:
+            return jsonify({'error': 'Provide a date or a list of visit_ids'}), 400
         
-        return send_file(
-            pdf_buffer,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'prescription_{patient.patient_id}_{visit.visit_date}.pdf'
+        # Visits and their patients in one query
+        query = db.session.query(Visit, Patient).join(Patient, Visit.patient_id == Patient.id)
+        if visit_ids:
+            if len(visit_ids) > BATCH_MAX_VISITS:
+                return jsonify({'error': f'At most {BATCH_MAX_VISITS} visits per batch'}), 400
+            rows = query.filter(Visit.id.in_(visit_ids)).all()
+            found = {visit.id for visit, _ in rows}
+            missing = [vid for vid in visit_ids if vid not in found]
+            if missing:
+                return jsonify({'error': 'Visits not found', 'missing_visit_ids': missing}), 404
+            denied = sorted({visit.id for visit, patient in rows if not has_patient_access(patient.id)})
+            if denied:
+                return jsonify({'error': 'Access denied to some visits', 'visit_ids': denied}), 403
+            order = {vid: i for i, vid in enumerate(visit_ids)}
+            rows.sort(key=lambda row: order[row[0].id])
+        else:
+            day = datetime.strptime(visit_date, '%Y-%m-%d').date()
+            rows = query.filter(Visit.visit_date == day).order_by(Visit.created_at, Visit.id).all()
+            # Only patients the current user can see
+            rows = [(visit, patient) for visit, patient in rows if has_patient_access(patient.id)]
+            if len(rows) > BATCH_MAX_VISITS:
+                return jsonify({'error': f'More than {BATCH_MAX_VISITS} visits on {visit_date}; pass visit_ids instead'}), 400
+        
+        if not rows:
+            return jsonify({'error': 'No visits to print'}), 404
+        
+        settings_version, settings = get_versioned_settings()
+        items = [(visit.to_dict(), patient.to_dict()) for visit, patient in rows]
+        label = visit_date or 'batch'
+        
+        if output_format == 'pdf':
+            return pdf_response(
+                'prescription_batch',
+                (items, settings),
+                settings_version,
+                f'prescriptions_{label}.pdf'
+            )
+        
+        # ZIP: entries are rendered at most PDF_WORKERS ahead of the one being
+        # written, so a batch never holds more than that many queue slots
+        entries = (
+            (f"prescription_{patient['patient_id']}_{visit['visit_date']}_{visit['id']}.pdf",
+             (visit, patient, settings))
+            for visit, patient in items
         )
+        chunks = _stream_prescriptions_zip(entries, settings_version)
+        # Render the first entry before answering, so a busy or timed-out
+        # renderer still gets its 503/504 instead of a 200 with a broken ZIP
+        first = next(chunks)
+        
+        def generate():
+            yield first
+            yield from chunks
+        
+        return Response(
+            generate(),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename=prescriptions_{label}.zip'}
+        )
+    except PdfRendererBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except PdfRenderTimeout as e:
+        return jsonify({'error': str(e)}), 504
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -44,47 +248,91 @@ def generate_certificate():
         additional_notes = data.get('additional_notes', '')
         
         patient = Patient.query.get_or_404(patient_id)
-        visits = [Visit.query.get_or_404(vid).to_dict() for vid in visit_ids]
-        settings = get_settings_dict()
-        
-        pdf_buffer = generate_certificate_pdf(
-            patient.to_dict(),
-            visits,
-            rest_period,
-            additional_notes,
-            settings
-        )
         
-        return send_file(
-            pdf_buffer,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'certificate_{patient.patient_id}.pdf'
+        # All requested visits in one query, restricted to this patient
+        visits_by_id = {
+            visit.id: visit for visit in
+            Visit.query.filter(Visit.patient_id == patient.id, Visit.id.in_(visit_ids)).all()
+        }
+        missing = [vid for vid in visit_ids if vid not in visits_by_id]
+        if missing:
+            return jsonify({
+                'error': 'Visits not found for this patient',
+                'missing_visit_ids': missing
+            }), 404
+        visits = [visits_by_id[vid].to_dict() for vid in visit_ids]
+        settings_version, settings = get_versioned_settings()
+        
+        return pdf_response(
+            'certificate',
+            (patient.to_dict(), visits, rest_period, additional_notes, settings),
+            settings_version,
+            f'certificate_{patient.patient_id}.pdf'
         )
+    except PdfRendererBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except PdfRenderTimeout as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@bp.route('/patient/<int:patient_id>', methods=['POST'])
+@bp.route('/patient/<int:patient_id>', methods=['GET', 'POST'])
 @login_required
 def generate_patient_report(patient_id):
     """Generate patient visit history report PDF"""
     try:
         patient = Patient.query.get_or_404(patient_id)
-        visits = Visit.query.filter_by(patient_id=patient_id).order_by(Visit.visit_date.desc()).all()
-        settings = get_settings_dict()
+        settings_version, settings = get_versioned_settings()
         
-        pdf_buffer = generate_patient_report_pdf(
-            patient.to_dict(),
-            [v.to_dict() for v in visits],
-            settings
-        )
+        # Cheap summary of the visit history, used for the header, the
+        # summary line and (for long histories) the cache key
+        visit_count, first_visit, last_visit, last_update, last_id = db.session.query(
+            db.func.count(Visit.id),
+            db.func.min(Visit.visit_date),
+            db.func.max(Visit.visit_date),
+            db.func.max(Visit.updated_at),
+            db.func.max(Visit.id)
+        ).filter(Visit.patient_id == patient_id).one()
+        
+        download_name = f'patient_report_{patient.patient_id}.pdf'
+        
+        if visit_count <= REPORT_STREAMING_THRESHOLD:
+            visits = Visit.query.filter_by(patient_id=patient_id).order_by(Visit.visit_date.desc()).all()
+            return pdf_response(
+                'patient_report',
+                (patient.to_dict(), [v.to_dict() for v in visits], settings),
+                settings_version,
+                download_name
+            )
         
-        return send_file(
-            pdf_buffer,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'patient_report_{patient.patient_id}.pdf'
+        # Long history: stream visits in batches straight into the PDF file
+        patient_data = patient.to_dict()
+        etag = pdf_cache_key(
+            'patient_report_stream', settings_version, patient_data,
+            visit_count, first_visit, last_visit, last_update, last_id
         )
+        
+        def visit_dicts():
+            query = Visit.query.filter_by(patient_id=patient_id).order_by(
+                Visit.visit_date.desc(), Visit.id.desc()
+            ).yield_per(REPORT_BATCH_SIZE)
+            for visit in query:
+                yield visit.to_dict()
+        
+        # Rendered on this thread (the visits come from this request's cursor), but
+        # inside a render queue slot and under the same timeout as pool renders
+        def render(output):
+            with pdf_slot():
+                write_patient_report_pdf(
+                    output, patient_data, with_deadline(visit_dicts()), visit_count,
+                    first_visit.isoformat(), last_visit.isoformat(), settings
+                )
+        
+        return send_cached_pdf(etag, render, download_name)
+    except PdfRendererBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except PdfRenderTimeout as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required
 from app.models import db, Settings
-from werkzeug.utils import secure_filename
-import os
+from app.utils.settings_cache import get_settings_dict, bump_settings_version
+from app.utils.letterhead import save_letterhead, remove_old_letterheads
 
 bp = Blueprint('settings', __name__, url_prefix='/api/settings')
 
@@ -17,9 +17,7 @@ def allowed_file(filename):
 def get_settings():
     """Get all settings as key-value object"""
     try:
-        settings = Settings.query.all()
-        result = {s.key: s.value for s in settings}
-        return jsonify(result), 200
+        return jsonify(get_settings_dict()), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -39,6 +37,7 @@ def update_setting(key):
             setting = Settings(key=key, value=value)
             db.session.add(setting)
         
+        bump_settings_version()
         db.session.commit()
         return jsonify(setting.to_dict()), 200
     except Exception as e:
@@ -59,10 +58,11 @@ def upload_letterhead():
             return jsonify({'error': 'No file selected'}), 400
         
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            # Save with fixed name for letterhead
-            filepath = os.path.join('static', 'letterhead.png')
-            file.save(filepath)
+            # Downscale, re-encode and save under a content fingerprint
+            try:
+                filepath = save_letterhead(file.stream, 'static')
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
             # Update settings
             setting = Settings.query.filter_by(key='letterhead_path').first()
@@ -72,7 +72,11 @@ def upload_letterhead():
                 setting = Settings(key='letterhead_path', value=filepath)
                 db.session.add(setting)
             
+            bump_settings_version()
             db.session.commit()
+            
+            # Only now that the setting points at the new file
+            remove_old_letterheads(filepath, 'static')
             return jsonify({'message': 'Letterhead uploaded successfully', 'path': filepath}), 200
         else:
             return jsonify({'error': 'Invalid file type. Only PNG and JPG allowed'}), 400
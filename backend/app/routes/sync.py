@@ -0,0 +1,87 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from app.models import db, Patient, Visit, PatientAccess, SyncTombstone
+from app.utils.access_control import get_accessible_patient_ids, get_accessible_patient_ids_select
+from app.utils.serialization import PATIENT_COLUMNS, VISIT_COLUMNS, ACCESS_COLUMNS, patient_row_to_dict, visit_row_to_dict
+from app.utils.sync import encode_sync_token, decode_sync_token
+from datetime import datetime
+
+bp = Blueprint('sync', __name__, url_prefix='/api/sync')
+
+
+@bp.route('', methods=['GET'])
+@login_required
+def get_changes():
+    """
+    Get patients, visits and access grants changed since a sync token.
+    
+    Without `since` a full snapshot of everything accessible is returned.
+    Clients apply `patients`, `visits` and `access` as upserts and `deleted`
+    as removals, then pass the returned `token` as `since` on the next call.
+    A deleted patient takes its visits and access grants with it: those are
+    not listed separately, so clients drop them along with the patient.
+    """
+    try:
+        issued_at = datetime.utcnow()
+        since = request.args.get('since')
+        cutoff = decode_sync_token(since) if since else None
+        
+        patients = db.session.query(*PATIENT_COLUMNS)
+        visits = db.session.query(*VISIT_COLUMNS)
+        grants = db.session.query(*ACCESS_COLUMNS)
+        
+        # Non-admins only see patients they created or that were shared with them
+        accessible_ids = get_accessible_patient_ids()
+        scope = get_accessible_patient_ids_select()
+        if scope is not None:
+            patients = patients.filter(Patient.id.in_(scope))
+            visits = visits.filter(Visit.patient_id.in_(scope))
+            grants = grants.filter(PatientAccess.patient_id.in_(scope))
+        
+        deleted = {'patients': [], 'visits': [], 'access': []}
+        if cutoff is not None:
+            # Patients shared with this user since the cutoff are sent in full,
+            # however long ago they were last edited
+            newly_shared = []
+            if accessible_ids is not None:
+                newly_shared = [row[0] for row in db.session.query(PatientAccess.patient_id).filter(
+                    PatientAccess.user_id == current_user.id,
+                    PatientAccess.granted_at > cutoff
+                )]
+            
+            patients = patients.filter(db.or_(Patient.updated_at > cutoff, Patient.id.in_(newly_shared)))
+            visits = visits.filter(db.or_(Visit.updated_at > cutoff, Visit.patient_id.in_(newly_shared)))
+            grants = grants.filter(db.or_(PatientAccess.granted_at > cutoff, PatientAccess.patient_id.in_(newly_shared)))
+            
+            tombstones = db.session.query(
+                SyncTombstone.entity, SyncTombstone.entity_id, SyncTombstone.patient_id, SyncTombstone.user_id
+            ).filter(SyncTombstone.deleted_at > cutoff).order_by(SyncTombstone.id)
+            
+            for entity, entity_id, patient_id, user_id in tombstones:
+                if entity == 'patient':
+                    # Written once per user who could see the patient
+                    if (accessible_ids is None or user_id == current_user.id) and entity_id not in deleted['patients']:
+                        deleted['patients'].append(entity_id)
+                elif accessible_ids is None or patient_id in accessible_ids:
+                    if entity == 'visit':
+                        deleted['visits'].append(entity_id)
+                    else:
+                        deleted['access'].append({'id': entity_id, 'patient_id': patient_id, 'user_id': user_id})
+                elif entity == 'access' and user_id == current_user.id:
+                    # This user's own access was revoked: the patient drops out of their view
+                    deleted['access'].append({'id': entity_id, 'patient_id': patient_id, 'user_id': user_id})
+                    if patient_id not in deleted['patients']:
+                        deleted['patients'].append(patient_id)
+        
+        return jsonify({
+            'token': encode_sync_token(issued_at),
+            'full': cutoff is None,
+            'patients': [patient_row_to_dict(row) for row in patients.order_by(Patient.id)],
+            'visits': [visit_row_to_dict(row) for row in visits.order_by(Visit.id)],
+            'access': [dict(row._mapping) for row in grants.order_by(PatientAccess.id)],
+            'deleted': deleted
+        }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
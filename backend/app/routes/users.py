@@ -3,6 +3,8 @@ from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
 from app import db
 from app.models import User
+from app.utils.user_cache import invalidate_user
+from app.utils.sync import record_tombstone
 
 bp = Blueprint('users', __name__, url_prefix='/api/users')
 
@@ -118,6 +120,8 @@ def update_user(id):
             user.password_hash = generate_password_hash(data['password'], method='pbkdf2:sha256')
         
         db.session.commit()
+        # Role, activation and password changes must not be served from the identity cache
+        invalidate_user(id)
         
         return jsonify({
             'message': 'User updated successfully',
@@ -146,8 +150,13 @@ def delete_user(id):
             if admin_count <= 1:
                 return jsonify({'error': 'Cannot delete the last admin user'}), 400
         
+        # Their access grants go with them; tell delta-sync clients
+        for access in user.patient_accesses:
+            record_tombstone('access', access.id, access.patient_id, access.user_id)
+        
         db.session.delete(user)
         db.session.commit()
+        invalidate_user(id)
         
         return jsonify({'message': 'User deleted successfully'}), 200
     except Exception as e:
@@ -1,6 +1,10 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required
 from app.models import db, Visit
+from app.utils.rollups import record_visit, record_visit_change
+from app.utils.serialization import VISIT_COLUMNS, VISIT_VIEWS, parse_fieldset, select_columns, visit_row_to_dict
+from app.utils.etags import compute_etag, not_modified, with_etag
+from app.utils.data_version import bump_data_version
 from datetime import datetime
 
 bp = Blueprint('visits', __name__, url_prefix='/api')
@@ -8,10 +12,26 @@ bp = Blueprint('visits', __name__, url_prefix='/api')
 @bp.route('/patients/<int:patient_id>/visits', methods=['GET'])
 @login_required
 def get_patient_visits(patient_id):
-    """Get all visits for a patient (newest first)"""
+    """Get all visits for a patient (newest first), optionally limited to a field set or view"""
     try:
-        visits = Visit.query.filter_by(patient_id=patient_id).order_by(Visit.visit_date.desc()).all()
-        return jsonify([visit.to_dict() for visit in visits]), 200
+        fields = parse_fieldset(VISIT_VIEWS, request.args.get('fields'), request.args.get('view'))
+        
+        # Conditional GET from the visit count and latest updated_at
+        meta = db.session.query(
+            db.func.count(Visit.id),
+            db.func.max(Visit.updated_at)
+        ).filter(Visit.patient_id == patient_id).one()
+        etag = compute_etag('visits', patient_id, tuple(meta), fields)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        
+        visits = db.session.query(*select_columns(VISIT_COLUMNS, fields)).filter(
+            Visit.patient_id == patient_id
+        ).order_by(Visit.visit_date.desc()).all()
+        return with_etag(jsonify([visit_row_to_dict(visit, fields) for visit in visits]), etag), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -47,6 +67,8 @@ def create_visit(patient_id):
         )
         
         db.session.add(visit)
+        record_visit(visit.visit_date, visit.chief_complaint)
+        bump_data_version()
         db.session.commit()
         
         return jsonify(visit.to_dict()), 201
@@ -62,6 +84,7 @@ def update_visit(id):
     try:
         visit = Visit.query.get_or_404(id)
         data = request.json
+        old_date, old_complaint = visit.visit_date, visit.chief_complaint
         
         # Update fields
         if 'visit_date' in data:
@@ -85,6 +108,8 @@ def update_visit(id):
         visit.last_edited_at = datetime.utcnow()
         visit.updated_at = datetime.utcnow()
         
+        record_visit_change(old_date, old_complaint, visit.visit_date, visit.chief_complaint)
+        bump_data_version()
         db.session.commit()
         
         return jsonify(visit.to_dict()), 200
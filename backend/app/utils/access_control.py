@@ -1,6 +1,70 @@
+from flask import g
 from flask_login import current_user
 from app.models import db, Patient, PatientAccess
-from sqlalchemy import or_
+from app.utils.sync import record_tombstone
+
+
+def _get_permissions(user_id):
+    """
+    Get the permission record for a user, loading it at most once per request.
+    The record is memoized on flask.g so repeated access checks within a
+    request don't re-query the user, patient or access tables.
+    
+    Args:
+        user_id: ID of the user
+    
+    Returns:
+        Dictionary with the user's role and (lazily loaded) accessible patient IDs
+    """
+    cache = g.setdefault('_patient_permissions', {})
+    permissions = cache.get(user_id)
+    if permissions is None:
+        # Reuse the already-loaded current_user instead of fetching it again
+        if current_user and current_user.is_authenticated and current_user.id == user_id:
+            role = current_user.role
+        else:
+            from app.models import User
+            user = db.session.get(User, user_id)
+            role = user.role if user else None
+        permissions = {'role': role, 'patient_ids': None}
+        cache[user_id] = permissions
+    return permissions
+
+
+def _get_accessible_patient_ids(user_id):
+    """
+    Get the set of patient IDs a non-admin user can access (created or shared),
+    loaded with a single query and memoized for the rest of the request.
+    
+    Args:
+        user_id: ID of the user
+    
+    Returns:
+        Set of patient IDs
+    """
+    permissions = _get_permissions(user_id)
+    if permissions['patient_ids'] is None:
+        created = db.session.query(Patient.id).filter(Patient.created_by == user_id)
+        shared = db.session.query(PatientAccess.patient_id).filter(PatientAccess.user_id == user_id)
+        permissions['patient_ids'] = {row[0] for row in created.union(shared).all()}
+    return permissions['patient_ids']
+
+
+def invalidate_permissions(user_id=None):
+    """
+    Drop memoized permissions for the current request.
+    Call after writes that change who can access which patient.
+    
+    Args:
+        user_id: ID of the user to invalidate (defaults to all users)
+    """
+    cache = g.get('_patient_permissions')
+    if not cache:
+        return
+    if user_id is None:
+        cache.clear()
+    else:
+        cache.pop(user_id, None)
 
 
 def has_patient_access(patient_id, user_id=None):
@@ -21,27 +85,12 @@ def has_patient_access(patient_id, user_id=None):
     if user_id is None:
         user_id = current_user.id
     
-    # Check if user is admin - admins can access all patients
-    from app.models import User
-    user = User.query.get(user_id)
-    if user and user.role == 'admin':
+    # Admins can access all patients
+    if _get_permissions(user_id)['role'] == 'admin':
         return True
     
-    patient = Patient.query.get(patient_id)
-    if not patient:
-        return False
-    
-    # Check if user is the creator
-    if patient.created_by == user_id:
-        return True
-    
-    # Check if user has shared access
-    shared_access = PatientAccess.query.filter_by(
-        patient_id=patient_id,
-        user_id=user_id
-    ).first()
-    
-    return shared_access is not None
+    # Creator or shared access
+    return patient_id in _get_accessible_patient_ids(user_id)
 
 
 def get_accessible_patients_query(user_id=None):
@@ -59,26 +108,56 @@ def get_accessible_patients_query(user_id=None):
     if user_id is None:
         user_id = current_user.id
     
-    # Check if user is admin - return all patients
-    from app.models import User
-    user = User.query.get(user_id)
-    if user and user.role == 'admin':
+    # Admins can access all patients
+    if _get_permissions(user_id)['role'] == 'admin':
         return Patient.query
     
-    # Get IDs of patients shared with the user
-    shared_patient_ids = db.session.query(PatientAccess.patient_id).filter_by(
-        user_id=user_id
-    ).subquery()
+    # Patients created by user OR shared with user. Filtered in SQL rather than
+    # with the memoized ID set, which would grow into one bind parameter per patient
+    shared_patient_ids = db.select(PatientAccess.patient_id).where(PatientAccess.user_id == user_id)
+    return Patient.query.filter(db.or_(
+        Patient.created_by == user_id,
+        Patient.id.in_(shared_patient_ids)
+    ))
+
+
+def get_accessible_patient_ids_select(user_id=None):
+    """
+    Get a subquery of the IDs of all patients accessible to the user, for
+    filtering tables that reference patients (visits, access grants).
+    
+    Args:
+        user_id: ID of the user (defaults to current_user.id)
+    
+    Returns:
+        SQLAlchemy select of patient IDs, or None for admins (who can access every patient)
+    """
+    if user_id is None:
+        user_id = current_user.id
+    
+    if _get_permissions(user_id)['role'] == 'admin':
+        return None
+    created = db.select(Patient.id).where(Patient.created_by == user_id)
+    shared = db.select(PatientAccess.patient_id).where(PatientAccess.user_id == user_id)
+    return created.union(shared)
+
+
+def get_accessible_patient_ids(user_id=None):
+    """
+    Get the IDs of all patients accessible to the user.
+    
+    Args:
+        user_id: ID of the user (defaults to current_user.id)
     
-    # Query for patients created by user OR shared with user
-    query = Patient.query.filter(
-        or_(
-            Patient.created_by == user_id,
-            Patient.id.in_(shared_patient_ids)
-        )
-    )
+    Returns:
+        Set of patient IDs, or None for admins (who can access every patient)
+    """
+    if user_id is None:
+        user_id = current_user.id
     
-    return query
+    if _get_permissions(user_id)['role'] == 'admin':
+        return None
+    return _get_accessible_patient_ids(user_id)
 
 
 def grant_patient_access(patient_id, user_ids, comment=None, granted_by=None):
@@ -133,6 +212,7 @@ def grant_patient_access(patient_id, user_ids, comment=None, granted_by=None):
             created_accesses.append(access)
     
     db.session.commit()
+    invalidate_permissions()
     return created_accesses
 
 
@@ -171,8 +251,10 @@ def revoke_patient_access(patient_id, user_id, revoked_by=None):
     ).first()
     
     if access:
+        record_tombstone('access', access.id, patient_id, user_id)
         db.session.delete(access)
         db.session.commit()
+        invalidate_permissions(user_id)
         return True
     
     return False
@@ -0,0 +1,41 @@
+from datetime import date
+
+
+def calculate_age(date_of_birth, today=None):
+    """
+    Age in whole years on a given day.
+
+    Args:
+        date_of_birth: Date of birth
+        today: Reference date (defaults to today)
+
+    Returns:
+        Age in years
+    """
+    if today is None:
+        today = date.today()
+    return today.year - date_of_birth.year - ((today.month, today.day) < (date_of_birth.month, date_of_birth.day))
+
+
+def latest_birth_date_for_age(years, today=None):
+    """
+    Latest date of birth at which someone is at least `years` old.
+
+    `age >= years` is equivalent to `date_of_birth <= latest_birth_date_for_age(years)`,
+    which lets age filters and buckets run as range predicates on the
+    indexed date_of_birth column.
+
+    Args:
+        years: Age in years
+        today: Reference date (defaults to today)
+
+    Returns:
+        Date
+    """
+    if today is None:
+        today = date.today()
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:
+        # Feb 29 on a non-leap target year
+        return today.replace(year=today.year - years, day=28)
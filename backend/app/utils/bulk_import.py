@@ -0,0 +1,380 @@
+import csv
+import io
+import json
+import os
+import secrets
+from collections import Counter
+from datetime import datetime
+from app.models import db, Patient, Visit
+from app.utils.ages import calculate_age
+from app.utils.patient_ids import allocate_patient_ids
+from app.utils.rollups import record_new_patient, record_visit
+from app.utils.data_version import bump_data_version
+
+
+# Rows validated and written per round trip
+IMPORT_BATCH_SIZE = max(1, int(os.getenv('IMPORT_BATCH_SIZE', '500')))
+# Only the first errors are returned in full; the rest are counted
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+PATIENT_REQUIRED = ('full_name', 'date_of_birth', 'gender', 'contact_number')
+PATIENT_TEXT_FIELDS = (
+    'full_name', 'gender', 'contact_number', 'email', 'address', 'occupation',
+    'allergies', 'chronic_conditions', 'current_medications', 'family_history',
+    'emergency_contact_name', 'emergency_contact_number'
+)
+PATIENT_DATE_FIELDS = ('date_of_birth',)
+
+VISIT_REQUIRED = ('visit_date', 'chief_complaint')
+VISIT_TEXT_FIELDS = (
+    'chief_complaint', 'symptoms', 'examination_findings', 'diagnosis',
+    'prescription', 'doctor_notes'
+)
+VISIT_DATE_FIELDS = ('visit_date', 'follow_up_date')
+VISIT_COPY_COLUMNS = VISIT_TEXT_FIELDS + VISIT_DATE_FIELDS + ('patient_id', 'created_at', 'updated_at')
+
+
+def detect_format(filename, requested=None):
+    """
+    Work out whether an upload is CSV or NDJSON.
+
+    Args:
+        filename: Name of the uploaded file
+        requested: Explicit 'csv' or 'ndjson' from the client (optional)
+
+    Returns:
+        'csv' or 'ndjson'
+
+    Raises:
+        ValueError: If the format is not supported
+    """
+    if requested:
+        if requested not in ('csv', 'ndjson'):
+            raise ValueError("format must be 'csv' or 'ndjson'")
+        return requested
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension not in IMPORT_FORMATS:
+        raise ValueError(f"Cannot tell the format of '{filename}', expected .csv, .ndjson or .jsonl")
+    return IMPORT_FORMATS[extension]
+
+
+def read_records(stream, fmt):
+    """
+    Lazily parse a binary stream of CSV (with a header row) or NDJSON records.
+
+    Args:
+        stream: Binary file-like object
+        fmt: 'csv' or 'ndjson'
+
+    Yields:
+        Tuples of (row number, record dict or None, parse error or None)
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+        while True:
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except (csv.Error, UnicodeDecodeError) as e:
+                # The reader cannot resynchronise after a malformed row
+                yield reader.line_num + 1, None, f'Unreadable CSV, import stopped here: {e}'
+                return
+            yield reader.line_num, record, None
+    else:
+        for number, line in enumerate(stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield number, None, 'Invalid JSON'
+                continue
+            if not isinstance(record, dict):
+                yield number, None, 'Each line must be a JSON object'
+                continue
+            yield number, record, None
+
+
+def _batches(records):
+    """Group an iterable into lists of IMPORT_BATCH_SIZE"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _clean(value):
+    """Normalise a raw field: strip strings and treat blanks as missing"""
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _validate(record, model, required, text_fields, date_fields):
+    """
+    Validate one record against a model's columns.
+
+    Returns:
+        Tuple of (column values, error message or None)
+    """
+    values = {}
+    for name in required:
+        if _clean(record.get(name)) is None:
+            return None, f"'{name}' is required"
+
+    for name in text_fields:
+        value = _clean(record.get(name))
+        if value is None:
+            values[name] = None
+            continue
+        value = str(value)
+        max_length = getattr(model.__table__.c[name].type, 'length', None)
+        if max_length and len(value) > max_length:
+            return None, f"'{name}' is longer than {max_length} characters"
+        values[name] = value
+
+    for name in date_fields:
+        value = _clean(record.get(name))
+        if value is None:
+            values[name] = None
+            continue
+        try:
+            values[name] = datetime.strptime(str(value), '%Y-%m-%d').date()
+        except ValueError:
+            return None, f"'{name}' must be a date in YYYY-MM-DD format"
+
+    return values, None
+
+
+def _copy_rows(table, columns, rows):
+    """
+    Load rows with COPY ... FROM STDIN on the session's own connection,
+    so they are written in the same transaction as everything else.
+    """
+    cursor = db.session.connection().connection.driver_connection.cursor()
+    try:
+        with cursor.copy(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row([row[column] for column in columns])
+    finally:
+        cursor.close()
+
+
+class _Importer:
+    """Running state of one import: created rows, refs and collected errors"""
+
+    def __init__(self, created_by, accessible_ids):
+        self.created_by = created_by
+        self.accessible_ids = accessible_ids
+        # Placeholder created_at/updated_at for every imported row and prefix of
+        # the placeholder patient IDs; both are replaced in finalize()
+        self.stamp = datetime.utcnow()
+        self.placeholder = f"~{secrets.token_hex(5)}-"
+        self.new_ids = []
+        self.patient_codes = {}
+        self.refs = {}
+        self.patients_created = 0
+        self.visits_created = 0
+        self.error_count = 0
+        self.errors = []
+
+    def error(self, source, row, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'file': source, 'row': row, 'error': message})
+
+    def import_patients(self, batch):
+        valid = []
+        batch_refs = set()
+        for row, record, error in batch:
+            ref = None
+            if error is None:
+                ref = _clean(record.get('ref'))
+                ref = str(ref) if ref is not None else None
+                if ref is not None and (ref in self.refs or ref in batch_refs):
+                    error = f"Duplicate ref '{ref}'"
+            if error is None:
+                values, error = _validate(record, Patient, PATIENT_REQUIRED, PATIENT_TEXT_FIELDS, PATIENT_DATE_FIELDS)
+            if error is not None:
+                self.error('patients', row, error)
+                continue
+            if ref is not None:
+                batch_refs.add(ref)
+            valid.append((ref, values))
+
+        if not valid:
+            return
+
+        # Real patient numbers are only taken from the sequence in finalize(), so
+        # dry runs and rolled-back imports do not use any up
+        params = []
+        for i, (ref, values) in enumerate(valid, len(self.new_ids)):
+            values.update(
+                patient_id=f"{self.placeholder}{i}",
+                stored_age=calculate_age(values['date_of_birth']),
+                created_by=self.created_by,
+                created_at=self.stamp,
+                updated_at=self.stamp
+            )
+            params.append(values)
+
+        # Multi-row INSERT ... RETURNING: the new primary keys are needed to link visits
+        ids = db.session.scalars(
+            db.insert(Patient).returning(Patient.id, sort_by_parameter_order=True), params
+        ).all()
+        for (ref, values), new_id in zip(valid, ids):
+            if ref is not None:
+                self.refs[ref] = new_id
+            if self.accessible_ids is not None:
+                self.accessible_ids.add(new_id)
+        self.new_ids.extend(ids)
+
+        self.patients_created += len(valid)
+
+    def import_visits(self, batch):
+        # Resolve display IDs of existing patients for the whole batch at once
+        codes = {
+            str(_clean(record.get('patient_id')))
+            for _, record, error in batch
+            if error is None and _clean(record.get('patient_ref')) is None and _clean(record.get('patient_id')) is not None
+        }
+        known = dict(
+            db.session.query(Patient.patient_id, Patient.id).filter(Patient.patient_id.in_(codes)).all()
+        ) if codes else {}
+
+        valid = []
+        for row, record, error in batch:
+            if error is None:
+                values, error = _validate(record, Visit, VISIT_REQUIRED, VISIT_TEXT_FIELDS, VISIT_DATE_FIELDS)
+            if error is None:
+                ref, code = _clean(record.get('patient_ref')), _clean(record.get('patient_id'))
+                if ref is not None:
+                    values['patient_id'] = self.refs.get(str(ref))
+                    if values['patient_id'] is None:
+                        error = f"Unknown patient_ref '{ref}'"
+                elif code is not None:
+                    values['patient_id'] = known.get(str(code))
+                    if values['patient_id'] is None:
+                        error = f"Unknown patient_id '{code}'"
+                else:
+                    error = "'patient_ref' or 'patient_id' is required"
+            if error is None and self.accessible_ids is not None and values['patient_id'] not in self.accessible_ids:
+                error = 'Access denied to this patient'
+            if error is not None:
+                self.error('visits', row, error)
+                continue
+            valid.append(values)
+
+        if not valid:
+            return
+
+        for values in valid:
+            values['created_at'] = self.stamp
+            values['updated_at'] = self.stamp
+
+        if db.engine.dialect.name == 'postgresql':
+            _copy_rows(Visit.__table__, VISIT_COPY_COLUMNS, valid)
+        else:
+            db.session.execute(db.insert(Visit), valid)
+
+        for (visit_date, complaint), count in Counter((v['visit_date'], v['chief_complaint']) for v in valid).items():
+            record_visit(visit_date, complaint, count)
+        self.visits_created += len(valid)
+
+    def finalize(self):
+        """
+        Give the imported patients their real patient IDs and set created_at/
+        updated_at of every imported row to the current time.
+
+        Call right before committing. Sequence numbers are not returned on
+        rollback, so allocating them only here keeps dry runs and failed imports
+        from leaving gaps. Delta sync only looks back SYNC_OVERLAP_SECONDS from
+        a token, so rows stamped when their batch was written could predate a
+        token cut while the import was still running.
+        """
+        now = datetime.utcnow()
+        codes = allocate_patient_ids(len(self.new_ids)) if self.new_ids else []
+        self.patient_codes = dict(zip(self.new_ids, codes))
+        for start in range(0, len(self.new_ids), IMPORT_BATCH_SIZE):
+            # Bulk UPDATE by primary key (executemany)
+            db.session.execute(db.update(Patient), [
+                {'id': new_id, 'patient_id': code, 'created_at': now, 'updated_at': now}
+                for new_id, code in zip(self.new_ids[start:start + IMPORT_BATCH_SIZE], codes[start:start + IMPORT_BATCH_SIZE])
+            ])
+        db.session.execute(
+            db.update(Visit).where(
+                Visit.created_at == self.stamp,
+                Visit.updated_at == self.stamp
+            ).values(created_at=now, updated_at=now).execution_options(synchronize_session=False)
+        )
+        record_new_patient(now, self.patients_created)
+
+
+def import_records(patients=None, visits=None, patients_format='csv', visits_format='csv',
+                   created_by=None, accessible_ids=None, skip_invalid=False, dry_run=False):
+    """
+    Bulk load patients and visits from CSV or NDJSON streams in one transaction.
+
+    Records are parsed lazily and validated and written IMPORT_BATCH_SIZE at a
+    time, so memory stays flat however large the input is. Patients are written
+    with multi-row INSERTs and get their IDs from allocate_patient_ids() only
+    once the import is going to commit; visits
+    are written with COPY on Postgres. Analytics rollups are updated in the
+    same transaction.
+
+    Patient records may carry a `ref`; visit records name their patient with
+    `patient_ref` (a ref from the same import) or `patient_id` (the display ID
+    of an existing patient, e.g. P-007).
+
+    Args:
+        patients: Binary stream of patient records (optional)
+        visits: Binary stream of visit records (optional)
+        patients_format: 'csv' or 'ndjson'
+        visits_format: 'csv' or 'ndjson'
+        created_by: User ID recorded as creator of the new patients
+        accessible_ids: Patient IDs the importing user may add visits to (None for admins)
+        skip_invalid: Commit the valid rows even if some rows fail validation
+        dry_run: Validate and load everything, then roll back
+
+    Returns:
+        Dictionary with created counts, per-row errors and whether the import was committed
+    """
+    importer = _Importer(created_by, set(accessible_ids) if accessible_ids is not None else None)
+
+    try:
+        if patients is not None:
+            for batch in _batches(read_records(patients, patients_format)):
+                importer.import_patients(batch)
+        if visits is not None:
+            for batch in _batches(read_records(visits, visits_format)):
+                importer.import_visits(batch)
+
+        committed = not dry_run and (skip_invalid or importer.error_count == 0)
+        if committed:
+            importer.finalize()
+            bump_data_version()
+            db.session.commit()
+        else:
+            db.session.rollback()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'committed': committed,
+        'dry_run': dry_run,
+        'patients_created': importer.patients_created if committed or dry_run else 0,
+        'visits_created': importer.visits_created if committed or dry_run else 0,
+        'refs': {ref: importer.patient_codes[new_id] for ref, new_id in importer.refs.items()} if committed else {},
+        'error_count': importer.error_count,
+        'errors': importer.errors
+    }
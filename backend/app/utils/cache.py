@@ -0,0 +1,74 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe, per-process LRU cache with a time-to-live per entry.
+
+    Each gunicorn worker holds its own instance, so invalidation only reaches
+    the worker that performed the write; other workers converge once their
+    entries expire. Hit and miss counters are kept for monitoring.
+    """
+
+    def __init__(self, ttl=30, max_size=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, ttl=None, max_size=None):
+        """Update cache limits and drop existing entries"""
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if max_size is not None:
+                self.max_size = max_size
+            self._entries.clear()
+
+    def get(self, key):
+        """Return the cached value for a key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        """Cache a value, evicting the least recently used entry when full"""
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop one key (or every key) from the cache"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """Hit/miss counters and current size for this worker"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'size': len(self._entries),
+                'ttl': self.ttl
+            }
@@ -0,0 +1,33 @@
+from app.models import db, DataVersion
+
+
+def get_data_version():
+    """
+    Current patient/visit data version (a single primary-key lookup).
+    Shared by every worker, so caches keyed on it are invalidated everywhere
+    as soon as a write commits.
+    """
+    return db.session.query(DataVersion.version).filter_by(id=1).scalar() or 0
+
+
+def bump_data_version():
+    """
+    Mark patient or visit data as changed. Call before committing the write so
+    the bump commits (or rolls back) together with it.
+    """
+    updated = DataVersion.query.filter_by(id=1).update(
+        {'version': DataVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(DataVersion(id=1, version=1))
+
+
+def ensure_data_version():
+    """Create the counter row on startup so concurrent bumps only ever update it"""
+    try:
+        if db.session.get(DataVersion, 1) is None:
+            db.session.add(DataVersion(id=1, version=0))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Data version initialization error: {e}")
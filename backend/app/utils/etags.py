@@ -0,0 +1,53 @@
+import hashlib
+from flask import request, current_app
+
+
+def compute_etag(*parts):
+    """
+    Build an ETag value from cheap metadata describing a response
+    (row counts, latest updated_at, request parameters, ...).
+
+    Args:
+        *parts: Values that change whenever the response body would change
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:32]
+
+
+def not_modified(etag):
+    """
+    Answer a conditional GET without building the response body.
+
+    Args:
+        etag: ETag of the current representation
+
+    Returns:
+        304 response when If-None-Match matches, otherwise None
+    """
+    if request.method in ('GET', 'HEAD') and request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+
+def with_etag(response, etag):
+    """
+    Attach a weak ETag to a response and require revalidation on reuse.
+
+    Args:
+        response: Response object
+        etag: ETag value from compute_etag
+
+    Returns:
+        The same response
+    """
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
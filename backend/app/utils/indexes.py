@@ -0,0 +1,35 @@
+from app.models import db
+
+
+# Indexes added to tables that existing deployments already have. create_all()
+# only builds indexes together with a new table, so these are created on startup.
+STARTUP_INDEXES = [
+    # Keyset pagination of the patient list and its latest-visit lookup
+    'ix_patients_full_name_id',
+    'ix_patients_created_at_id',
+    'ix_visits_patient_id_visit_date',
+    # Dashboard age buckets
+    'ix_patients_date_of_birth',
+    # Delta sync
+    'ix_patients_updated_at',
+    'ix_visits_updated_at',
+    'ix_patient_access_granted_at',
+    'ix_sync_tombstones_deleted_at',
+]
+
+
+def ensure_indexes():
+    """
+    Create any STARTUP_INDEXES missing from the database (CREATE INDEX IF NOT EXISTS).
+    Safe to run on every startup; a failure is reported and leaves the others in place.
+    """
+    indexes = {
+        index.name: index
+        for table in db.metadata.tables.values()
+        for index in table.indexes
+    }
+    for name in STARTUP_INDEXES:
+        try:
+            indexes[name].create(db.engine, checkfirst=True)
+        except Exception as e:
+            print(f"Index creation error ({name}): {e}")
@@ -0,0 +1,150 @@
+import hashlib
+import os
+from functools import lru_cache
+from io import BytesIO
+from PIL import Image as PILImage
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable
+
+
+# Printed size of the letterhead on certificates, in inches
+LETTERHEAD_WIDTH_IN = 6
+LETTERHEAD_HEIGHT_IN = 2
+# Resolution the letterhead is stored at; anything finer is wasted in the PDF
+LETTERHEAD_DPI = int(os.getenv('LETTERHEAD_DPI', '200'))
+JPEG_QUALITY = 88
+
+
+def _normalize(image):
+    """Flatten onto white and downscale to the printed size at LETTERHEAD_DPI"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = PILImage.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    max_size = (LETTERHEAD_WIDTH_IN * LETTERHEAD_DPI, LETTERHEAD_HEIGHT_IN * LETTERHEAD_DPI)
+    image.thumbnail(max_size, PILImage.LANCZOS)
+    return image
+
+
+def prepare_letterhead(stream):
+    """
+    Normalize an uploaded letterhead image.
+
+    The image is downscaled to the printed size at LETTERHEAD_DPI and
+    re-encoded as whichever of PNG (logos, text) or JPEG (photos) is smaller.
+
+    Args:
+        stream: File-like object with PNG/JPG data
+
+    Returns:
+        Tuple of (encoded bytes, file extension, fingerprint)
+
+    Raises:
+        ValueError: If the data is not a readable image
+    """
+    try:
+        image = PILImage.open(stream)
+        image.load()
+    except Exception:
+        raise ValueError('Invalid image file')
+
+    image = _normalize(image)
+
+    png = BytesIO()
+    image.save(png, format='PNG', optimize=True)
+    jpeg = BytesIO()
+    image.save(jpeg, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+
+    data, ext = (png.getvalue(), 'png') if png.tell() <= jpeg.tell() else (jpeg.getvalue(), 'jpg')
+    fingerprint = hashlib.sha256(data).hexdigest()[:16]
+    return data, ext, fingerprint
+
+
+def save_letterhead(stream, directory='static'):
+    """
+    Normalize an uploaded letterhead and save it under a fingerprinted name.
+    Older letterheads are left in place; call remove_old_letterheads once the
+    new path has been committed to settings.
+
+    Args:
+        stream: File-like object with PNG/JPG data
+        directory: Directory to save into
+
+    Returns:
+        Path of the saved letterhead
+    """
+    data, ext, fingerprint = prepare_letterhead(stream)
+    filepath = os.path.join(directory, f'letterhead_{fingerprint}.{ext}')
+
+    tmp_path = f'{filepath}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, filepath)
+    return filepath
+
+
+def remove_old_letterheads(keep, directory='static'):
+    """
+    Delete saved letterheads other than `keep`.
+
+    Args:
+        keep: Path of the letterhead the settings now point at
+        directory: Directory the letterheads are saved in
+    """
+    for name in os.listdir(directory):
+        old_path = os.path.join(directory, name)
+        if name.startswith('letterhead') and old_path != keep and not name.endswith('.tmp'):
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+class LetterheadImage(Flowable):
+    """Flowable drawing a pre-decoded ImageReader at a fixed size"""
+
+    def __init__(self, reader, width, height):
+        Flowable.__init__(self)
+        self.reader = reader
+        self.width = width
+        self.height = height
+        self.hAlign = 'CENTER'
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height)
+
+
+@lru_cache(maxsize=4)
+def _load_reader(path, mtime):
+    max_size = (LETTERHEAD_WIDTH_IN * LETTERHEAD_DPI, LETTERHEAD_HEIGHT_IN * LETTERHEAD_DPI)
+    with PILImage.open(path) as image:
+        if image.mode == 'RGB' and image.width <= max_size[0] and image.height <= max_size[1]:
+            # Already normalized; reading from the file lets JPEGs embed without re-encoding
+            return ImageReader(path)
+        # Letterheads uploaded before normalization existed may be full resolution
+        image.load()
+        return ImageReader(_normalize(image))
+
+
+def get_letterhead_reader(path):
+    """
+    Get a decoded, print-sized ImageReader for a letterhead, cached in memory
+    for as long as the file is unchanged.
+
+    Args:
+        path: Path to the letterhead image
+
+    Returns:
+        ImageReader, or None if the file is missing or unreadable
+    """
+    try:
+        return _load_reader(path, os.path.getmtime(path))
+    except Exception:
+        return None
@@ -0,0 +1,113 @@
+import base64
+import json
+from datetime import datetime
+from app.models import db
+
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded or does not match the query"""
+
+
+def parse_limit(value):
+    """
+    Parse the `limit` query parameter.
+
+    Args:
+        value: Raw query string value (may be None)
+
+    Returns:
+        Page size clamped to 1..MAX_PAGE_SIZE
+
+    Raises:
+        ValueError: If the value is not an integer
+    """
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def encode_cursor(sort_key, order, value, row_id):
+    """
+    Build an opaque cursor pointing just after the given row.
+
+    Args:
+        sort_key: Name of the sort mode the cursor belongs to
+        order: 'asc' or 'desc'
+        value: Sort column value of the last row on the page
+        row_id: Primary key of the last row (tie-breaker)
+
+    Returns:
+        URL-safe string
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({'s': sort_key, 'o': order, 'v': value, 'id': row_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort_key, order):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Args:
+        cursor: Cursor string from the client
+        sort_key: Sort mode of the current request
+        order: Sort order of the current request
+
+    Returns:
+        Tuple of (value, row_id)
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or was issued for another sort mode
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value, row_id = payload['v'], int(payload['id'])
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+
+    if payload.get('s') != sort_key or payload.get('o') != order:
+        raise InvalidCursor('Cursor does not match the requested sort order')
+    return value, row_id
+
+
+def apply_keyset(query, sort_column, id_column, order, cursor_value=None, cursor_id=None):
+    """
+    Order a query by (sort_column, id_column) and seek past the cursor position.
+
+    The primary key is used as a tie-breaker so that rows sharing a sort value
+    are neither skipped nor repeated between pages. Because the seek is a plain
+    row comparison on an indexed prefix, deep pages cost the same as page one.
+
+    Args:
+        query: SQLAlchemy query to paginate
+        sort_column: Column being sorted on
+        id_column: Unique tie-breaker column
+        order: 'asc' or 'desc'
+        cursor_value: Sort value of the last row on the previous page
+        cursor_id: Tie-breaker value of the last row on the previous page
+
+    Returns:
+        Ordered (and filtered, when a cursor is given) query
+    """
+    if cursor_id is not None:
+        if sort_column.type.python_type is datetime and isinstance(cursor_value, str):
+            cursor_value = datetime.fromisoformat(cursor_value)
+        position = db.tuple_(sort_column, id_column)
+        if order == 'desc':
+            query = query.filter(position < db.tuple_(cursor_value, cursor_id))
+        else:
+            query = query.filter(position > db.tuple_(cursor_value, cursor_id))
+
+    if order == 'desc':
+        return query.order_by(sort_column.desc(), id_column.desc())
+    return query.order_by(sort_column.asc(), id_column.asc())
@@ -0,0 +1,92 @@
+import os
+import threading
+from collections import deque
+from sqlalchemy import text
+from app.models import db, Patient, patient_number_seq
+
+
+PATIENT_ID_PREFIX = 'P-'
+
+# Numbers to reserve from the sequence per round trip (1 keeps IDs in creation order)
+PATIENT_ID_BLOCK_SIZE = max(1, int(os.getenv('PATIENT_ID_BLOCK_SIZE', '1')))
+
+_reserved = deque()
+_reserved_lock = threading.Lock()
+
+
+def format_patient_id(number):
+    """Format a patient number as a display ID, e.g. 7 -> 'P-007'"""
+    return f"{PATIENT_ID_PREFIX}{str(number).zfill(3)}"
+
+
+def _max_existing_number():
+    """Highest numeric suffix among existing patient IDs (0 if none)"""
+    suffix = db.func.substr(Patient.patient_id, len(PATIENT_ID_PREFIX) + 1)
+    query = db.session.query(db.func.max(db.cast(suffix, db.Integer))).filter(
+        Patient.patient_id.like(f'{PATIENT_ID_PREFIX}%')
+    )
+    return query.scalar() or 0
+
+
+def ensure_patient_id_sequence():
+    """
+    Move the patient number sequence past every existing patient ID.
+    Needed once for databases created before the sequence existed; safe to
+    run on every startup because the sequence is never moved backwards.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    try:
+        max_number = _max_existing_number()
+        if max_number > 0:
+            db.session.execute(
+                text("SELECT setval('patient_number_seq', GREATEST(last_value, :n)) FROM patient_number_seq"),
+                {'n': max_number}
+            )
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"Patient ID sequence initialization error: {e}")
+
+
+def _fetch_numbers(count):
+    """Reserve `count` numbers from the database"""
+    if db.engine.dialect.name != 'postgresql':
+        # Development fallback without sequences; not safe under concurrent writers
+        start = _max_existing_number() + 1
+        return list(range(start, start + count))
+
+    rows = db.session.execute(
+        db.select(patient_number_seq.next_value()).select_from(db.func.generate_series(1, count))
+    ).scalars().all()
+    return sorted(rows)
+
+
+def allocate_patient_ids(count=1):
+    """
+    Allocate new unique patient IDs.
+
+    Numbers come from a Postgres sequence, so allocation is O(1), never
+    collides between concurrent requests and never takes a lock on the
+    patients table. With PATIENT_ID_BLOCK_SIZE > 1 each worker reserves a
+    block of numbers per round trip and hands them out from memory; unused
+    numbers in a block are skipped if the worker restarts.
+
+    Args:
+        count: Number of IDs to allocate
+
+    Returns:
+        List of formatted patient IDs
+    """
+    if PATIENT_ID_BLOCK_SIZE == 1 or db.engine.dialect.name != 'postgresql':
+        return [format_patient_id(n) for n in _fetch_numbers(count)]
+
+    with _reserved_lock:
+        if len(_reserved) < count:
+            _reserved.extend(_fetch_numbers(max(PATIENT_ID_BLOCK_SIZE, count - len(_reserved))))
+        return [format_patient_id(_reserved.popleft()) for _ in range(count)]
+
+
+def next_patient_id():
+    """Allocate a single new patient ID"""
+    return allocate_patient_ids(1)[0]
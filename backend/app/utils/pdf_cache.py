@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import date
+from app.utils.pdf_generator import TEMPLATE_VERSION
+
+
+# Directory holding rendered PDFs, named by content hash (relative paths resolve like static/letterhead.png)
+PDF_CACHE_DIR = os.path.abspath(os.getenv('PDF_CACHE_DIR', os.path.join('static', 'pdf_cache')))
+# Total size the cache may grow to before least recently used files are evicted (0 disables)
+PDF_CACHE_MAX_BYTES = int(os.getenv('PDF_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+
+# Documents whose content depends on the current date as well as their inputs
+DATED_KINDS = {'certificate'}
+
+
+def pdf_cache_key(kind, settings_version, *args):
+    """
+    Hash everything that determines a rendered PDF.
+
+    Args:
+        kind: Renderer name (see pdf_pool.RENDERERS)
+        settings_version: Version from get_versioned_settings
+        *args: Renderer arguments (plain dicts/lists/strings)
+
+    Returns:
+        Hex digest used as file name and ETag
+    """
+    payload = {
+        'kind': kind,
+        'args': args,
+        'settings_version': settings_version,
+        'template_version': TEMPLATE_VERSION,
+    }
+    if kind in DATED_KINDS:
+        payload['date'] = date.today().isoformat()
+    encoded = json.dumps(payload, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(PDF_CACHE_DIR, f'{key}.pdf')
+
+
+def get_cached_pdf(key):
+    """
+    Look up a rendered PDF and mark it as recently used.
+
+    Returns:
+        Path to the cached file, or None
+    """
+    if PDF_CACHE_MAX_BYTES <= 0:
+        return None
+    path = _cache_path(key)
+    try:
+        os.utime(path)
+    except OSError:
+        return None
+    return path
+
+
+def _evict():
+    """Delete least recently used files until the cache fits PDF_CACHE_MAX_BYTES"""
+    entries = []
+    total = 0
+    with os.scandir(PDF_CACHE_DIR) as it:
+        for entry in it:
+            if not entry.name.endswith('.pdf'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= PDF_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def render_cached_pdf(key, render):
+    """
+    Return the cached PDF for `key`, rendering it on a miss.
+
+    Args:
+        key: Content key from pdf_cache_key
+        render: Callable writing the PDF into a binary file object
+
+    Returns:
+        Path to the cached file, or an open temporary file (positioned at
+        the start) when caching is disabled
+    """
+    path = get_cached_pdf(key)
+    if path:
+        return path
+
+    if PDF_CACHE_MAX_BYTES <= 0:
+        output = tempfile.TemporaryFile()
+        render(output)
+        output.seek(0)
+        return output
+
+    # Render straight into the cache directory, then publish atomically
+    os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+    path = _cache_path(key)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, 'wb') as output:
+            render(output)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _evict()
+    return path
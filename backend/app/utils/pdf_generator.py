@@ -1,62 +1,166 @@
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from io import BytesIO
 from datetime import datetime
-import os
+from functools import lru_cache
+from app.utils.letterhead import get_letterhead_reader, LetterheadImage
+import copy
 
-def generate_prescription_pdf(visit, patient, settings):
-    """Generate prescription PDF"""
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    story = []
+# Bump when the layout of any generated document changes
+TEMPLATE_VERSION = 2
+
+
+@lru_cache(maxsize=1)
+def get_styles():
+    """Build every paragraph style used by the PDFs (once per process)"""
     styles = getSampleStyleSheet()
+    return {
+        # Shared
+        'details': ParagraphStyle('Details', parent=styles['Normal'], fontSize=10, alignment=TA_CENTER),
+        'signature': ParagraphStyle('Signature', parent=styles['Normal'], fontSize=11, alignment=TA_RIGHT),
+        # Prescription
+        'rx_header': ParagraphStyle(
+            'CustomHeader',
+            parent=styles['Heading1'],
+            fontSize=16,
+            textColor=colors.HexColor('#0d9488'),
+            spaceAfter=6,
+            alignment=TA_CENTER
+        ),
+        'rx_title': ParagraphStyle('Prescription', parent=styles['Heading2'], fontSize=14, spaceAfter=12),
+        'rx_patient': ParagraphStyle('Patient', parent=styles['Normal'], fontSize=11),
+        # Certificate
+        'cert_header': ParagraphStyle('Header', parent=styles['Heading1'], fontSize=18, alignment=TA_CENTER, textColor=colors.HexColor('#0d9488')),
+        'cert_title': ParagraphStyle('Title', parent=styles['Heading1'], fontSize=16, alignment=TA_CENTER, spaceAfter=20),
+        'cert_body': ParagraphStyle('Body', parent=styles['Normal'], fontSize=12, spaceAfter=12),
+        'cert_footer': ParagraphStyle('Footer', parent=styles['Normal'], fontSize=11),
+        # Patient report
+        'report_header': ParagraphStyle('Header', parent=styles['Heading1'], fontSize=16, alignment=TA_CENTER, textColor=colors.HexColor('#0d9488')),
+        'report_title': ParagraphStyle('Title', parent=styles['Heading2'], fontSize=14, alignment=TA_CENTER),
+        'report_patient': ParagraphStyle('Patient', parent=styles['Normal'], fontSize=11, spaceAfter=6),
+        'report_allergy': ParagraphStyle('Allergy', parent=styles['Normal'], fontSize=11, textColor=colors.red, spaceAfter=6),
+        'report_visit': ParagraphStyle('Visit', parent=styles['Normal'], fontSize=10, spaceAfter=10),
+    }
+
+
+class PdfTemplate:
+    """
+    Static header/footer flowables for one set of clinic settings.
+
+    Built once per distinct settings and reused across requests; each
+    document gets shallow copies so layout state from one build never leaks
+    into another (or into a concurrent build on another thread).
+    """
+    
+    def __init__(self, settings):
+        styles = get_styles()
+        clinic_name = settings.get('clinic_name', 'Gayatri Homeo Clinic')
+        
+        # Prescription header
+        story = [Paragraph(clinic_name, styles['rx_header'])]
+        if settings.get('clinic_address'):
+            story.append(Paragraph(settings['clinic_address'], styles['details']))
+        if settings.get('clinic_contact'):
+            story.append(Paragraph(f"Contact: {settings['clinic_contact']}", styles['details']))
+        if settings.get('clinic_email'):
+            story.append(Paragraph(f"Email: {settings['clinic_email']}", styles['details']))
+        story.append(Spacer(1, 0.2*inch))
+        if settings.get('doctor_qualifications'):
+            story.append(Paragraph(f"Dr. {settings['doctor_qualifications']}", styles['details']))
+        if settings.get('doctor_registration_number'):
+            story.append(Paragraph(f"Reg. No: {settings['doctor_registration_number']}", styles['details']))
+        story.append(Spacer(1, 0.3*inch))
+        story.append(Spacer(1, 0.1*inch))
+        story.append(Paragraph("PRESCRIPTION", styles['rx_title']))
+        self._prescription_header = story
+        
+        self._prescription_footer = [
+            Spacer(1, 0.5*inch),
+            Spacer(1, 0.5*inch),
+            Paragraph("_____________________", styles['signature']),
+            Paragraph("Doctor's Signature", styles['signature']),
+        ]
+        
+        # Certificate text header (used when there is no letterhead image)
+        story = [Paragraph(clinic_name, styles['cert_header'])]
+        if settings.get('clinic_address'):
+            story.append(Paragraph(settings['clinic_address'], styles['details']))
+        if settings.get('clinic_contact'):
+            story.append(Paragraph(f"Contact: {settings['clinic_contact']}", styles['details']))
+        story.append(Spacer(1, 0.3*inch))
+        self._certificate_text_header = story
+        
+        self._certificate_intro = [
+            Paragraph("MEDICAL CERTIFICATE", styles['cert_title']),
+            Spacer(1, 0.3*inch),
+            Paragraph("This is to certify that:", styles['cert_body']),
+            Spacer(1, 0.1*inch),
+        ]
+        
+        story = [
+            Paragraph(f"Place: {settings.get('clinic_address', '')}", styles['cert_footer']),
+            Spacer(1, 0.5*inch),
+            Paragraph("_____________________", styles['signature']),
+            Paragraph("Doctor's Signature", styles['signature']),
+        ]
+        if settings.get('doctor_registration_number'):
+            story.append(Paragraph(f"Reg. No: {settings['doctor_registration_number']}", styles['signature']))
+        self._certificate_footer = story
+        
+        # Patient report header
+        self._report_header = [
+            Paragraph(clinic_name, styles['report_header']),
+            Spacer(1, 0.1*inch),
+            Paragraph("PATIENT VISIT HISTORY REPORT", styles['report_title']),
+            Spacer(1, 0.3*inch),
+        ]
     
-    # Header style
-    header_style = ParagraphStyle(
-        'CustomHeader',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor=colors.HexColor('#0d9488'),
-        spaceAfter=6,
-        alignment=TA_CENTER
-    )
-    
-    # Clinic name
-    clinic_name = settings.get('clinic_name', 'Gayatri Homeo Clinic')
-    story.append(Paragraph(clinic_name, header_style))
-    
-    # Clinic details
-    details_style = ParagraphStyle('Details', parent=styles['Normal'], fontSize=10, alignment=TA_CENTER)
-    if settings.get('clinic_address'):
-        story.append(Paragraph(settings['clinic_address'], details_style))
-    if settings.get('clinic_contact'):
-        story.append(Paragraph(f"Contact: {settings['clinic_contact']}", details_style))
-    if settings.get('clinic_email'):
-        story.append(Paragraph(f"Email: {settings['clinic_email']}", details_style))
+    @staticmethod
+    def _copy(flowables):
+        return [copy.copy(f) for f in flowables]
     
-    story.append(Spacer(1, 0.2*inch))
+    def prescription_header(self):
+        return self._copy(self._prescription_header)
     
-    # Doctor qualifications
-    if settings.get('doctor_qualifications'):
-        story.append(Paragraph(f"Dr. {settings['doctor_qualifications']}", details_style))
-    if settings.get('doctor_registration_number'):
-        story.append(Paragraph(f"Reg. No: {settings['doctor_registration_number']}", details_style))
+    def prescription_footer(self):
+        return self._copy(self._prescription_footer)
     
-    story.append(Spacer(1, 0.3*inch))
+    def certificate_text_header(self):
+        return self._copy(self._certificate_text_header)
     
-    # Horizontal line
-    story.append(Spacer(1, 0.1*inch))
+    def certificate_intro(self):
+        return self._copy(self._certificate_intro)
+    
+    def certificate_footer(self):
+        return self._copy(self._certificate_footer)
     
-    # Prescription heading
-    prescription_style = ParagraphStyle('Prescription', parent=styles['Heading2'], fontSize=14, spaceAfter=12)
-    story.append(Paragraph("PRESCRIPTION", prescription_style))
+    def report_header(self):
+        return self._copy(self._report_header)
+
+
+@lru_cache(maxsize=8)
+def _get_template(settings_items):
+    return PdfTemplate(dict(settings_items))
+
+
+def get_template(settings):
+    """Get the PdfTemplate for a settings dict, building it on first use"""
+    return _get_template(tuple(sorted(settings.items())))
+
+
+def prescription_story(visit, patient, template):
+    """Flowables for one prescription page"""
+    styles = get_styles()
+    
+    # Clinic header, doctor details and heading
+    story = template.prescription_header()
     
     # Patient details
-    patient_style = ParagraphStyle('Patient', parent=styles['Normal'], fontSize=11)
+    patient_style = styles['rx_patient']
     story.append(Paragraph(f"<b>Patient Name:</b> {patient['full_name']}", patient_style))
     story.append(Paragraph(f"<b>Age:</b> {patient['age']} years &nbsp;&nbsp;&nbsp; <b>Gender:</b> {patient['gender']}", patient_style))
     story.append(Paragraph(f"<b>Date:</b> {visit['visit_date']}", patient_style))
@@ -78,13 +182,39 @@ def generate_prescription_pdf(visit, patient, settings):
         if line.strip():
             story.append(Paragraph(line, patient_style))
     
-    story.append(Spacer(1, 0.5*inch))
-    
     # Doctor's signature
-    signature_style = ParagraphStyle('Signature', parent=styles['Normal'], fontSize=11, alignment=TA_RIGHT)
-    story.append(Spacer(1, 0.5*inch))
-    story.append(Paragraph("_____________________", signature_style))
-    story.append(Paragraph("Doctor's Signature", signature_style))
+    story.extend(template.prescription_footer())
+    return story
+
+
+def generate_prescription_pdf(visit, patient, settings):
+    """Generate prescription PDF"""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    
+    # Build PDF
+    doc.build(prescription_story(visit, patient, get_template(settings)))
+    buffer.seek(0)
+    return buffer
+
+
+def generate_prescriptions_pdf(items, settings):
+    """
+    Generate one PDF with a prescription per page.
+    
+    Args:
+        items: List of (visit, patient) dict pairs
+        settings: Settings dict
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    template = get_template(settings)
+    
+    story = []
+    for i, (visit, patient) in enumerate(items):
+        if i:
+            story.append(PageBreak())
+        story.extend(prescription_story(visit, patient, template))
     
     # Build PDF
     doc.build(story)
@@ -97,43 +227,27 @@ def generate_certificate_pdf(patient, visits, rest_period, additional_notes, set
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     story = []
-    styles = getSampleStyleSheet()
+    styles = get_styles()
+    template = get_template(settings)
     
-    # Add letterhead if exists
+    # Add letterhead if exists (decoded once per process and reused)
+    letterhead = None
     letterhead_path = settings.get('letterhead_path', '')
-    if letterhead_path and os.path.exists(letterhead_path):
-        try:
-            img = Image(letterhead_path, width=6*inch, height=2*inch)
-            story.append(img)
-            story.append(Spacer(1, 0.2*inch))
-        except:
-            pass
-    
-    # Header if no letterhead
-    if not letterhead_path or not os.path.exists(letterhead_path):
-        header_style = ParagraphStyle('Header', parent=styles['Heading1'], fontSize=18, alignment=TA_CENTER, textColor=colors.HexColor('#0d9488'))
-        clinic_name = settings.get('clinic_name', 'Gayatri Homeo Clinic')
-        story.append(Paragraph(clinic_name, header_style))
-        
-        details_style = ParagraphStyle('Details', parent=styles['Normal'], fontSize=10, alignment=TA_CENTER)
-        if settings.get('clinic_address'):
-            story.append(Paragraph(settings['clinic_address'], details_style))
-        if settings.get('clinic_contact'):
-            story.append(Paragraph(f"Contact: {settings['clinic_contact']}", details_style))
-        
-        story.append(Spacer(1, 0.3*inch))
+    if letterhead_path:
+        letterhead = get_letterhead_reader(letterhead_path)
     
-    # Certificate title
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=16, alignment=TA_CENTER, spaceAfter=20)
-    story.append(Paragraph("MEDICAL CERTIFICATE", title_style))
+    if letterhead:
+        story.append(LetterheadImage(letterhead, 6*inch, 2*inch))
+        story.append(Spacer(1, 0.2*inch))
+    else:
+        # Header if no letterhead
+        story.extend(template.certificate_text_header())
     
-    story.append(Spacer(1, 0.3*inch))
+    # Certificate title and opening line
+    story.extend(template.certificate_intro())
     
     # Certificate body
-    body_style = ParagraphStyle('Body', parent=styles['Normal'], fontSize=12, spaceAfter=12)
-    
-    story.append(Paragraph("This is to certify that:", body_style))
-    story.append(Spacer(1, 0.1*inch))
+    body_style = styles['cert_body']
     
     story.append(Paragraph(f"<b>Patient Name:</b> {patient['full_name']}", body_style))
     story.append(Paragraph(f"<b>Age:</b> {patient['age']} years", body_style))
@@ -170,19 +284,9 @@ def generate_certificate_pdf(patient, visits, rest_period, additional_notes, set
     
     story.append(Spacer(1, 0.5*inch))
     
-    # Footer
-    footer_style = ParagraphStyle('Footer', parent=styles['Normal'], fontSize=11)
-    story.append(Paragraph(f"Date: {datetime.now().strftime('%Y-%m-%d')}", footer_style))
-    story.append(Paragraph(f"Place: {settings.get('clinic_address', '')}", footer_style))
-    
-    story.append(Spacer(1, 0.5*inch))
-    
-    # Signature
-    signature_style = ParagraphStyle('Signature', parent=styles['Normal'], fontSize=11, alignment=TA_RIGHT)
-    story.append(Paragraph("_____________________", signature_style))
-    story.append(Paragraph("Doctor's Signature", signature_style))
-    if settings.get('doctor_registration_number'):
-        story.append(Paragraph(f"Reg. No: {settings['doctor_registration_number']}", signature_style))
+    # Footer (date changes daily, place and signature come from the template)
+    story.append(Paragraph(f"Date: {datetime.now().strftime('%Y-%m-%d')}", styles['cert_footer']))
+    story.extend(template.certificate_footer())
     
     # Build PDF
     doc.build(story)
@@ -190,26 +294,61 @@ def generate_certificate_pdf(patient, visits, rest_period, additional_notes, set
     return buffer
 
 
+class StreamingStory(list):
+    """
+    Story list that refills itself from a generator of flowables as
+    doc.build consumes it, so only a small window of flowables (and the
+    records they were built from) is in memory at any time.
+    """
+    
+    def __init__(self, head, source, low_water=64):
+        list.__init__(self, head)
+        self._source = iter(source)
+        self._low_water = low_water
+    
+    def _refill(self):
+        while self._source is not None and list.__len__(self) < self._low_water:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+    
+    def __len__(self):
+        self._refill()
+        return list.__len__(self)
+    
+    def __getitem__(self, index):
+        self._refill()
+        return list.__getitem__(self, index)
+
+
 def generate_patient_report_pdf(patient, visits, settings):
     """Generate complete patient visit history report"""
     buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    story = []
-    styles = getSampleStyleSheet()
+    first_visit = visits[-1]['visit_date'] if visits else None
+    last_visit = visits[0]['visit_date'] if visits else None
+    write_patient_report_pdf(buffer, patient, visits, len(visits), first_visit, last_visit, settings)
+    buffer.seek(0)
+    return buffer
+
+
+def write_patient_report_pdf(output, patient, visits, visit_count, first_visit, last_visit, settings):
+    """
+    Write the patient visit history report to a file-like object.
     
-    # Header
-    header_style = ParagraphStyle('Header', parent=styles['Heading1'], fontSize=16, alignment=TA_CENTER, textColor=colors.HexColor('#0d9488'))
-    clinic_name = settings.get('clinic_name', 'Gayatri Homeo Clinic')
-    story.append(Paragraph(clinic_name, header_style))
-    story.append(Spacer(1, 0.1*inch))
+    `visits` may be any iterable of visit dicts (newest first), such as a
+    generator over a server-side cursor; visits are turned into flowables
+    only as pages are laid out.
+    """
+    doc = SimpleDocTemplate(output, pagesize=A4)
+    styles = get_styles()
+    template = get_template(settings)
     
-    # Report title
-    title_style = ParagraphStyle('Title', parent=styles['Heading2'], fontSize=14, alignment=TA_CENTER)
-    story.append(Paragraph("PATIENT VISIT HISTORY REPORT", title_style))
-    story.append(Spacer(1, 0.3*inch))
+    # Header and report title
+    story = template.report_header()
     
     # Patient overview
-    patient_style = ParagraphStyle('Patient', parent=styles['Normal'], fontSize=11, spaceAfter=6)
+    patient_style = styles['report_patient']
     story.append(Paragraph(f"<b>Patient ID:</b> {patient['patient_id']}", patient_style))
     story.append(Paragraph(f"<b>Name:</b> {patient['full_name']}", patient_style))
     story.append(Paragraph(f"<b>Age:</b> {patient['age']} years", patient_style))
@@ -217,46 +356,43 @@ def generate_patient_report_pdf(patient, visits, settings):
     story.append(Paragraph(f"<b>Contact:</b> {patient['contact_number']}", patient_style))
     
     if patient.get('allergies'):
-        allergy_style = ParagraphStyle('Allergy', parent=styles['Normal'], fontSize=11, textColor=colors.red, spaceAfter=6)
-        story.append(Paragraph(f"<b>ALLERGIES:</b> {patient['allergies']}", allergy_style))
+        story.append(Paragraph(f"<b>ALLERGIES:</b> {patient['allergies']}", styles['report_allergy']))
     
     story.append(Spacer(1, 0.3*inch))
     
     # Visit history
-    visit_style = ParagraphStyle('Visit', parent=styles['Normal'], fontSize=10, spaceAfter=10)
-    story.append(Paragraph(f"<b>Total Visits:</b> {len(visits)}", patient_style))
+    story.append(Paragraph(f"<b>Total Visits:</b> {visit_count}", patient_style))
     story.append(Spacer(1, 0.2*inch))
     
-    # Individual visits
-    for i, visit in enumerate(visits, 1):
-        story.append(Paragraph(f"<b>Visit {i} - {visit['visit_date']}</b>", patient_style))
-        story.append(Paragraph(f"<b>Chief Complaint:</b> {visit['chief_complaint']}", visit_style))
-        
-        if visit.get('symptoms'):
-            story.append(Paragraph(f"<b>Symptoms:</b> {visit['symptoms']}", visit_style))
-        
-        if visit.get('examination_findings'):
-            story.append(Paragraph(f"<b>Examination:</b> {visit['examination_findings']}", visit_style))
+    def visit_flowables():
+        visit_style = styles['report_visit']
         
-        if visit.get('diagnosis'):
-            story.append(Paragraph(f"<b>Diagnosis:</b> {visit['diagnosis']}", visit_style))
+        # Individual visits
+        for i, visit in enumerate(visits, 1):
+            yield Paragraph(f"<b>Visit {i} - {visit['visit_date']}</b>", patient_style)
+            yield Paragraph(f"<b>Chief Complaint:</b> {visit['chief_complaint']}", visit_style)
+            
+            if visit.get('symptoms'):
+                yield Paragraph(f"<b>Symptoms:</b> {visit['symptoms']}", visit_style)
+            
+            if visit.get('examination_findings'):
+                yield Paragraph(f"<b>Examination:</b> {visit['examination_findings']}", visit_style)
+            
+            if visit.get('diagnosis'):
+                yield Paragraph(f"<b>Diagnosis:</b> {visit['diagnosis']}", visit_style)
+            
+            if visit.get('prescription'):
+                yield Paragraph(f"<b>Prescription:</b> {visit['prescription']}", visit_style)
+            
+            if visit.get('doctor_notes'):
+                yield Paragraph(f"<b>Notes:</b> {visit['doctor_notes']}", visit_style)
+            
+            yield Spacer(1, 0.2*inch)
         
-        if visit.get('prescription'):
-            story.append(Paragraph(f"<b>Prescription:</b> {visit['prescription']}", visit_style))
-        
-        if visit.get('doctor_notes'):
-            story.append(Paragraph(f"<b>Notes:</b> {visit['doctor_notes']}", visit_style))
-        
-        story.append(Spacer(1, 0.2*inch))
-    
-    # Summary
-    if visits:
-        first_visit = visits[-1]['visit_date']
-        last_visit = visits[0]['visit_date']
-        story.append(Spacer(1, 0.3*inch))
-        story.append(Paragraph(f"<b>Summary:</b> Total {len(visits)} visits from {first_visit} to {last_visit}", patient_style))
+        # Summary
+        if visit_count:
+            yield Spacer(1, 0.3*inch)
+            yield Paragraph(f"<b>Summary:</b> Total {visit_count} visits from {first_visit} to {last_visit}", patient_style)
     
     # Build PDF
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+    doc.build(StreamingStory(story, visit_flowables()))
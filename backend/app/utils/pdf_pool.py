@@ -0,0 +1,206 @@
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from app.utils.pdf_generator import generate_prescription_pdf, generate_prescriptions_pdf, generate_certificate_pdf, generate_patient_report_pdf
+
+
+# Render processes per gunicorn worker (0 renders on the request thread)
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', '2'))
+# Renders allowed to be queued or running per gunicorn worker before rejecting
+PDF_QUEUE_SIZE = int(os.getenv('PDF_QUEUE_SIZE', '16'))
+# Seconds a request waits for a queue slot and then for its render
+PDF_RENDER_TIMEOUT = float(os.getenv('PDF_RENDER_TIMEOUT', '60'))
+
+RENDERERS = {
+    'prescription': generate_prescription_pdf,
+    'prescription_batch': generate_prescriptions_pdf,
+    'certificate': generate_certificate_pdf,
+    'patient_report': generate_patient_report_pdf,
+}
+
+
+class PdfRendererBusy(RuntimeError):
+    """Raised when the render queue is full"""
+
+
+class PdfRenderTimeout(RuntimeError):
+    """Raised when a render does not finish within PDF_RENDER_TIMEOUT"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(1, PDF_QUEUE_SIZE))
+
+
+def _render(kind, args):
+    """Runs in a pool process: render a PDF from plain dict inputs and return its bytes"""
+    return RENDERERS[kind](*args).getvalue()
+
+
+def _get_executor():
+    """Create the process pool lazily, so each gunicorn worker gets its own after forking"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn avoids inheriting the parent's threads and database connections
+            _executor = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+        return _executor
+
+
+def _discard_executor(executor):
+    """
+    Drop a broken process pool (a render process died, e.g. OOM-killed) so
+    the next render builds a fresh one instead of failing until restart.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _on_render_done(executor, future):
+    """Free the render's queue slot and replace the pool if the render broke it"""
+    _slots.release()
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        _discard_executor(executor)
+
+
+def submit_pdf(kind, *args):
+    """
+    Queue a PDF render in the process pool without waiting for it.
+
+    Arguments must be plain picklable data (the dicts produced by to_dict and
+    the settings dict). With PDF_WORKERS=0 the render runs immediately on the
+    calling thread.
+
+    Args:
+        kind: Renderer name (see RENDERERS)
+        *args: Positional arguments for the matching generate_*_pdf function
+
+    Returns:
+        Future resolving to the PDF bytes; pass it to wait_pdf
+
+    Raises:
+        PdfRendererBusy: If no queue slot frees up within PDF_RENDER_TIMEOUT, or
+            the process pool broke and is being replaced
+    """
+    if PDF_WORKERS <= 0:
+        future = Future()
+        try:
+            future.set_result(_render(kind, args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    if not _slots.acquire(timeout=PDF_RENDER_TIMEOUT):
+        raise PdfRendererBusy('PDF renderer is busy, please try again')
+
+    executor = _get_executor()
+    try:
+        future = executor.submit(_render, kind, args)
+    except BrokenProcessPool:
+        _slots.release()
+        _discard_executor(executor)
+        raise PdfRendererBusy('PDF renderer is restarting, please try again')
+    except Exception:
+        _slots.release()
+        raise
+    # Free the slot when the render actually finishes, not when the caller gives up
+    future.add_done_callback(lambda f: _on_render_done(executor, f))
+    return future
+
+
+def wait_pdf(future):
+    """
+    Wait for a render queued with submit_pdf.
+
+    Returns:
+        PDF file contents as bytes
+
+    Raises:
+        PdfRendererBusy: If a render process died; the pool is replaced for the next request
+        PdfRenderTimeout: If the render takes longer than PDF_RENDER_TIMEOUT
+    """
+    try:
+        return future.result(timeout=PDF_RENDER_TIMEOUT)
+    except BrokenProcessPool:
+        raise PdfRendererBusy('PDF renderer is restarting, please try again')
+    except TimeoutError:
+        future.cancel()
+        raise PdfRenderTimeout('PDF rendering timed out')
+
+
+def render_pdf(kind, *args):
+    """
+    Render a PDF in the process pool and wait for the result.
+
+    CPU-bound ReportLab work runs on other cores while the request thread
+    only blocks on the result.
+
+    Args:
+        kind: Renderer name (see RENDERERS)
+        *args: Positional arguments for the matching generate_*_pdf function
+
+    Returns:
+        PDF file contents as bytes
+
+    Raises:
+        PdfRendererBusy: If PDF_QUEUE_SIZE renders are already pending or the pool broke
+        PdfRenderTimeout: If the render takes longer than PDF_RENDER_TIMEOUT
+    """
+    return wait_pdf(submit_pdf(kind, *args))
+
+
+@contextmanager
+def pdf_slot():
+    """
+    Hold a render queue slot for a PDF rendered on the calling thread.
+
+    Streaming renders read from a database cursor as they go, so they cannot be
+    handed to the process pool. Holding a slot still keeps them inside
+    PDF_QUEUE_SIZE, at the cost of rendering on a gunicorn thread (in this
+    worker's process) instead of a render process.
+
+    Raises:
+        PdfRendererBusy: If no queue slot frees up within PDF_RENDER_TIMEOUT
+    """
+    if PDF_WORKERS <= 0:
+        yield
+        return
+
+    if not _slots.acquire(timeout=PDF_RENDER_TIMEOUT):
+        raise PdfRendererBusy('PDF renderer is busy, please try again')
+    try:
+        yield
+    finally:
+        _slots.release()
+
+
+def with_deadline(items, timeout=None):
+    """
+    Iterate over `items`, giving up once the render has run too long.
+    The deadline is checked between items, so it can be overrun by the time
+    one item takes to render.
+
+    Args:
+        items: Iterable feeding a render on the calling thread
+        timeout: Seconds allowed (default PDF_RENDER_TIMEOUT)
+
+    Raises:
+        PdfRenderTimeout: If the deadline passes before the items run out
+    """
+    deadline = time.monotonic() + (PDF_RENDER_TIMEOUT if timeout is None else timeout)
+    for item in items:
+        if time.monotonic() > deadline:
+            raise PdfRenderTimeout('PDF rendering timed out')
+        yield item
@@ -0,0 +1,134 @@
+import threading
+import time
+import weakref
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """
+    Thread-safe counters describing connection pool use in this worker process.
+    Fed by TimedQueuePool and the pool event listeners from instrument_engine().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Zero every counter"""
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.checkout_timeouts = 0
+            self.peak_checked_out = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.waits = 0
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def record_checkout(self, checked_out):
+        with self._lock:
+            self.checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+            if timed_out:
+                self.checkout_timeouts += 1
+
+    def snapshot(self, pool):
+        """
+        Current pool state plus counters since the process started.
+
+        Args:
+            pool: The engine's connection pool
+
+        Returns:
+            Dictionary of metrics
+        """
+        with self._lock:
+            counters = {
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'invalidations': self.invalidations,
+                'checkout_timeouts': self.checkout_timeouts,
+                'peak_checked_out': self.peak_checked_out,
+                'checkout_wait_total_ms': round(self.wait_total * 1000, 3),
+                'checkout_wait_max_ms': round(self.wait_max * 1000, 3),
+                'checkout_wait_avg_ms': round(self.wait_total * 1000 / self.waits, 3) if self.waits else 0.0,
+            }
+
+        state = {'pool_class': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            state.update({
+                'pool_size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                # QueuePool.overflow() counts up from -pool_size until the pool is full
+                'overflow': max(0, pool.overflow()),
+            })
+        state.update(counters)
+        return state
+
+
+pool_metrics = PoolMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+
+_instrumented = weakref.WeakSet()
+
+
+def instrument_engine(engine):
+    """
+    Attach the pool event listeners that feed pool_metrics.
+    Safe to call more than once for the same engine.
+
+    Args:
+        engine: SQLAlchemy engine
+    """
+    if engine in _instrumented:
+        return
+    _instrumented.add(engine)
+    pool = engine.pool
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        pool_metrics.increment('connects')
+
+    @event.listens_for(engine, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        checked_out = pool.checkedout() if isinstance(pool, QueuePool) else 0
+        pool_metrics.record_checkout(checked_out)
+
+    @event.listens_for(engine, 'checkin')
+    def on_checkin(dbapi_connection, connection_record):
+        pool_metrics.increment('checkins')
+
+    # Raised for connections found dead (e.g. by pre-ping after a Postgres restart)
+    @event.listens_for(engine, 'invalidate')
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        pool_metrics.increment('invalidations')
@@ -0,0 +1,174 @@
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import db, Patient, Visit, DailyVisitStats, DailyComplaintStats, DailyPatientStats
+from app.utils.data_version import bump_data_version
+
+
+# Advisory lock key so only one worker backfills the rollups on startup
+ROLLUP_BACKFILL_LOCK = 0x726f6c6c
+
+
+def _increment(model, keys, column, delta):
+    """
+    Add `delta` to a rollup counter, creating the row if needed.
+    Runs in the caller's transaction so the rollup commits with the write.
+    
+    Args:
+        model: Rollup model class
+        keys: Dictionary of primary key values
+        column: Name of the counter column
+        delta: Amount to add (may be negative)
+    """
+    if not delta:
+        return
+    
+    table = model.__table__
+    insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    stmt = insert(table).values(**keys, **{column: delta})
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: table.c[column] + delta}
+    )
+    db.session.execute(stmt)
+
+
+def record_visit(visit_date, complaint, delta=1):
+    """
+    Count a visit (or un-count it with delta=-1) in the daily rollups.
+    
+    Args:
+        visit_date: Date of the visit
+        complaint: Chief complaint of the visit
+        delta: +1 when a visit is added, -1 when it is removed
+    """
+    _increment(DailyVisitStats, {'day': visit_date}, 'visit_count', delta)
+    if complaint:
+        _increment(DailyComplaintStats, {'day': visit_date, 'complaint': complaint}, 'visit_count', delta)
+
+
+def record_visit_change(old_date, old_complaint, new_date, new_complaint):
+    """
+    Move a visit between rollup buckets after its date or complaint changed.
+    """
+    if (old_date, old_complaint) == (new_date, new_complaint):
+        return
+    record_visit(old_date, old_complaint, -1)
+    record_visit(new_date, new_complaint, 1)
+
+
+def record_new_patient(created_at, delta=1):
+    """
+    Count a newly created patient (or un-count a deleted one with delta=-1).
+    
+    Args:
+        created_at: Creation timestamp of the patient
+        delta: +1 on create, -1 on delete
+    """
+    if created_at is None:
+        return
+    _increment(DailyPatientStats, {'day': created_at.date()}, 'new_patients', delta)
+
+
+def record_patient_deleted(patient):
+    """
+    Remove a patient and all of their visits from the rollups.
+    Call before deleting the patient (visits are removed by cascade).
+    """
+    record_new_patient(patient.created_at, -1)
+    
+    visit_counts = db.session.query(
+        Visit.visit_date, Visit.chief_complaint, db.func.count(Visit.id)
+    ).filter(Visit.patient_id == patient.id).group_by(Visit.visit_date, Visit.chief_complaint).all()
+    for visit_date, complaint, count in visit_counts:
+        record_visit(visit_date, complaint, -count)
+
+
+def rebuild_rollups():
+    """
+    Recompute every rollup table from the patients and visits tables.
+    Used to backfill existing data and to repair drift; runs in one transaction.
+    
+    Returns:
+        Dictionary with the number of rows written per rollup table
+    """
+    try:
+        for model in (DailyVisitStats, DailyComplaintStats, DailyPatientStats):
+            db.session.query(model).delete()
+        
+        visit_days = db.select(
+            Visit.visit_date, db.func.count(Visit.id)
+        ).group_by(Visit.visit_date)
+        db.session.execute(
+            db.insert(DailyVisitStats).from_select(['day', 'visit_count'], visit_days)
+        )
+        
+        complaint_days = db.select(
+            Visit.visit_date, Visit.chief_complaint, db.func.count(Visit.id)
+        ).filter(
+            Visit.chief_complaint.isnot(None),
+            Visit.chief_complaint != ''
+        ).group_by(Visit.visit_date, Visit.chief_complaint)
+        db.session.execute(
+            db.insert(DailyComplaintStats).from_select(['day', 'complaint', 'visit_count'], complaint_days)
+        )
+        
+        created_day = db.func.date(Patient.created_at)
+        patient_days = db.select(
+            created_day, db.func.count(Patient.id)
+        ).filter(Patient.created_at.isnot(None)).group_by(created_day)
+        db.session.execute(
+            db.insert(DailyPatientStats).from_select(['day', 'new_patients'], patient_days)
+        )
+        
+        # Cached dashboards were built from the old rollups
+        bump_data_version()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    return {
+        'daily_visit_stats': DailyVisitStats.query.count(),
+        'daily_complaint_stats': DailyComplaintStats.query.count(),
+        'daily_patient_stats': DailyPatientStats.query.count()
+    }
+
+
+def _rollups_missing():
+    """True if data exists that the (empty) rollup tables do not count yet"""
+    visits_missing = (
+        db.session.query(Visit.id).limit(1).first() is not None
+        and db.session.query(DailyVisitStats.day).limit(1).first() is None
+    )
+    patients_missing = (
+        db.session.query(Patient.id).filter(Patient.created_at.isnot(None)).limit(1).first() is not None
+        and db.session.query(DailyPatientStats.day).limit(1).first() is None
+    )
+    return visits_missing or patients_missing
+
+
+def ensure_rollups():
+    """
+    Backfill the rollup tables on databases that had data before they existed.
+    Safe to run on every startup: once the rollups hold rows it does nothing.
+    On Postgres a transaction-level advisory lock lets one worker rebuild while
+    the others skip; the lock is released when the rebuild commits.
+    """
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            locked = db.session.execute(
+                text("SELECT pg_try_advisory_xact_lock(:key)"), {'key': ROLLUP_BACKFILL_LOCK}
+            ).scalar()
+            if not locked:
+                db.session.rollback()
+                return
+        
+        if not _rollups_missing():
+            db.session.rollback()
+            return
+        
+        counts = rebuild_rollups()
+        print(f"Backfilled analytics rollups: {counts}")
+    except Exception as e:
+        db.session.rollback()
+        print(f"Rollup backfill error: {e}")
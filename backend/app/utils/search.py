@@ -0,0 +1,108 @@
+from sqlalchemy import text
+from app.models import db, Patient
+
+
+# GIN trigram indexes backing substring search on the patient list
+TRIGRAM_INDEXES = [
+    ('ix_patients_full_name_trgm', 'full_name'),
+    ('ix_patients_patient_id_trgm', 'patient_id'),
+    ('ix_patients_contact_number_trgm', 'contact_number'),
+]
+
+_trigram_available = None
+
+
+def trigram_available(refresh=False):
+    """
+    Check whether the pg_trgm extension is installed in the current database.
+    The result is cached for the lifetime of the process.
+
+    Args:
+        refresh: Re-run the check instead of using the cached result
+
+    Returns:
+        Boolean indicating if trigram search can be used
+    """
+    global _trigram_available
+    if _trigram_available is not None and not refresh:
+        return _trigram_available
+
+    if db.engine.dialect.name != 'postgresql':
+        _trigram_available = False
+        return _trigram_available
+
+    try:
+        with db.engine.connect() as conn:
+            row = conn.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first()
+        _trigram_available = row is not None
+    except Exception:
+        _trigram_available = False
+    return _trigram_available
+
+
+def ensure_trigram_indexes():
+    """
+    Install pg_trgm (when permitted) and create the trigram indexes.
+    Safe to run on every startup; failures leave search on the ILIKE fallback.
+
+    Returns:
+        Boolean indicating if trigram search is available
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return False
+
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    except Exception as e:
+        print(f"pg_trgm extension unavailable, patient search will use ILIKE: {e}")
+
+    if not trigram_available(refresh=True):
+        return False
+
+    for index_name, column in TRIGRAM_INDEXES:
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(text(
+                    f'CREATE INDEX IF NOT EXISTS {index_name} ON patients USING gin ({column} gin_trgm_ops)'
+                ))
+        except Exception as e:
+            print(f"Trigram index creation error ({index_name}): {e}")
+    return True
+
+
+def apply_patient_search(query, search):
+    """
+    Filter a patient query by a free-text search term.
+
+    With pg_trgm the filter matches substrings of name, patient ID and contact
+    number (served by the GIN trigram indexes) plus fuzzy word matches on the
+    name, and a similarity rank is returned for ordering. Without the extension
+    the plain ILIKE substring filter is applied and no rank is returned.
+
+    Args:
+        query: Patient query to filter
+        search: Search term from the client
+
+    Returns:
+        Tuple of (filtered query, rank expression or None)
+    """
+    search_term = f'%{search}%'
+    substring_match = db.or_(
+        Patient.full_name.ilike(search_term),
+        Patient.patient_id.ilike(search_term),
+        Patient.contact_number.ilike(search_term)
+    )
+
+    if not trigram_available():
+        return query.filter(substring_match), None
+
+    term = db.literal(search)
+    query = query.filter(db.or_(substring_match, term.op('<%')(Patient.full_name)))
+    rank = db.func.greatest(
+        db.func.word_similarity(term, Patient.full_name),
+        db.func.similarity(term, Patient.patient_id),
+        db.func.similarity(term, Patient.contact_number),
+        type_=db.Float
+    )
+    return query, rank
@@ -0,0 +1,219 @@
+import json
+from datetime import date
+from flask.json.provider import DefaultJSONProvider, _default as flask_default
+from app.models import Patient, Visit, PatientAccess
+from app.utils.ages import calculate_age
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+# Columns selected for patient payloads, matching the keys of Patient.to_dict()
+# (age is derived from date_of_birth after the fetch)
+PATIENT_COLUMNS = (
+    Patient.id,
+    Patient.patient_id,
+    Patient.full_name,
+    Patient.date_of_birth,
+    Patient.gender,
+    Patient.contact_number,
+    Patient.email,
+    Patient.address,
+    Patient.occupation,
+    Patient.allergies,
+    Patient.chronic_conditions,
+    Patient.current_medications,
+    Patient.family_history,
+    Patient.emergency_contact_name,
+    Patient.emergency_contact_number,
+    Patient.created_at,
+    Patient.updated_at,
+)
+
+# Columns selected for visit payloads, matching the keys of Visit.to_dict()
+VISIT_COLUMNS = (
+    Visit.id,
+    Visit.patient_id,
+    Visit.visit_date,
+    Visit.chief_complaint,
+    Visit.symptoms,
+    Visit.examination_findings,
+    Visit.diagnosis,
+    Visit.prescription,
+    Visit.follow_up_date,
+    Visit.doctor_notes,
+    Visit.created_at,
+    Visit.updated_at,
+    Visit.last_edited_at,
+)
+# Columns selected for access grant payloads (PatientAccess.to_dict() without the joined names)
+ACCESS_COLUMNS = (
+    PatientAccess.id,
+    PatientAccess.patient_id,
+    PatientAccess.user_id,
+    PatientAccess.granted_by,
+    PatientAccess.access_comment,
+    PatientAccess.granted_at,
+)
+
+
+# Named projections for list endpoints; 'full' is the default and lists every field
+PATIENT_VIEWS = {
+    'summary': ('id', 'patient_id', 'full_name', 'date_of_birth', 'age', 'gender',
+                'contact_number', 'latest_visit_date'),
+    'full': tuple(column.key for column in PATIENT_COLUMNS) + ('age', 'latest_visit_date'),
+}
+
+VISIT_VIEWS = {
+    'summary': ('id', 'patient_id', 'visit_date', 'chief_complaint', 'diagnosis',
+                'follow_up_date', 'last_edited_at'),
+    'full': tuple(column.key for column in VISIT_COLUMNS),
+}
+
+# Fields computed after the fetch, and the columns they are computed from
+PATIENT_DERIVED_FIELDS = {'age': ('date_of_birth',)}
+
+
+def parse_fieldset(views, fields=None, view=None):
+    """
+    Resolve the `fields` / `view` query parameters into a list of field names.
+
+    An explicit `fields` list wins over `view`; with neither, the full view is
+    used. The `id` field is always included.
+
+    Args:
+        views: Projection map such as PATIENT_VIEWS
+        fields: Comma-separated field names from the client (may be None)
+        view: Name of a projection from the client (may be None)
+
+    Returns:
+        Tuple of field names in output order
+
+    Raises:
+        ValueError: If a field or view name is unknown
+    """
+    if fields:
+        names = [name.strip() for name in fields.split(',') if name.strip()]
+        unknown = [name for name in names if name not in views['full']]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    else:
+        view = view or 'full'
+        if view not in views:
+            raise ValueError(f"Unknown view '{view}', expected one of: {', '.join(views)}")
+        names = views[view]
+
+    if 'id' not in names:
+        names = ['id', *names]
+    return tuple(dict.fromkeys(names))
+
+
+def select_columns(columns, names, derived=None):
+    """
+    Pick the columns needed to produce the given fields, so unrequested
+    columns (notably the large TEXT ones) are never read from the database.
+
+    Args:
+        columns: Candidate columns such as PATIENT_COLUMNS
+        names: Field names from parse_fieldset
+        derived: Map of computed field name to the column keys it needs
+
+    Returns:
+        List of columns in the order of `columns`
+    """
+    needed = set(names)
+    for name, sources in (derived or {}).items():
+        if name in needed:
+            needed.update(sources)
+    return [column for column in columns if column.key in needed]
+
+
+def patient_row_to_dict(row, fields=None):
+    """
+    Build a patient payload from a Core row selected with PATIENT_COLUMNS.
+
+    Dates are left as date/datetime objects; the app's JSON provider encodes
+    them as ISO 8601, the same format Patient.to_dict() produces.
+
+    Args:
+        row: Result row containing the patient columns (extra columns are copied too)
+        fields: Field names to return (defaults to every column in the row plus age)
+
+    Returns:
+        Dictionary with patient data
+    """
+    data = dict(row._mapping)
+    if fields is None or 'age' in fields:
+        dob = data.get('date_of_birth')
+        data['age'] = calculate_age(dob) if dob else None
+    if fields is not None:
+        return {name: data[name] for name in fields}
+    return data
+
+
+def visit_row_to_dict(row, fields=None):
+    """
+    Build a visit payload from a Core row selected with VISIT_COLUMNS.
+
+    Args:
+        row: Result row containing the visit columns
+        fields: Field names to return (defaults to every column in the row)
+
+    Returns:
+        Dictionary with visit data
+    """
+    data = dict(row._mapping)
+    if fields is not None:
+        return {name: data[name] for name in fields}
+    return data
+
+
+def _json_default(o):
+    """Encode dates as ISO 8601 (Flask's default is an HTTP date) and defer the rest to Flask"""
+    if isinstance(o, date):
+        return o.isoformat()
+    return flask_default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider used for every jsonify() response and request.json body.
+
+    Uses orjson when it is installed, which serializes dicts, lists, dates and
+    datetimes natively in C, and falls back to the standard library otherwise.
+    Both paths emit dates as ISO 8601 strings.
+    """
+
+    default = staticmethod(_json_default)
+
+    def _orjson_options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def _indent(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            kwargs.setdefault('default', self.default)
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._orjson_options(self._indent()))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,57 @@
+import threading
+from app.models import db, Settings, SettingsVersion
+
+
+_cache = {'version': None, 'values': None}
+_cache_lock = threading.Lock()
+
+
+def _current_version():
+    """Read the shared settings version (a single primary-key lookup)"""
+    return db.session.query(SettingsVersion.version).filter_by(id=1).scalar() or 0
+
+
+def get_versioned_settings():
+    """
+    Get all settings together with the version they were read at, served
+    from a per-process cache.
+
+    Each call only reads the shared version counter; the settings table is
+    re-read when another worker (or this one) has bumped the version since
+    the cache was filled.
+
+    Returns:
+        Tuple of (version, dictionary of setting key -> value); the
+        dictionary is a copy and safe to modify
+    """
+    # Read the version before the rows so a concurrent update can only make
+    # the cached rows newer than their version, never older
+    version = _current_version()
+    with _cache_lock:
+        if _cache['version'] == version:
+            return version, dict(_cache['values'])
+
+    values = {s.key: s.value for s in Settings.query.all()}
+    with _cache_lock:
+        _cache['version'] = version
+        _cache['values'] = values
+    return version, dict(values)
+
+
+def get_settings_dict():
+    """Get all settings as a dictionary (see get_versioned_settings)"""
+    return get_versioned_settings()[1]
+
+
+def bump_settings_version():
+    """
+    Mark settings as changed. Call before committing a settings write so the
+    bump commits (or rolls back) together with it.
+    """
+    updated = SettingsVersion.query.filter_by(id=1).update(
+        {'version': SettingsVersion.version + 1}, synchronize_session=False
+    )
+    if not updated:
+        db.session.add(SettingsVersion(id=1, version=1))
+    with _cache_lock:
+        _cache['version'] = None
@@ -0,0 +1,85 @@
+import base64
+import os
+from datetime import datetime, timedelta
+from app.models import db, PatientAccess, SyncTombstone
+
+
+# Rows written this long before a token was issued are sent again on the next
+# sync, covering transactions that were still in flight when the token was cut.
+# Clients apply deltas as upserts, so the repeats are harmless.
+SYNC_OVERLAP_SECONDS = int(os.getenv('SYNC_OVERLAP_SECONDS', '5'))
+
+
+class InvalidSyncToken(ValueError):
+    """Raised when a sync token cannot be decoded"""
+
+
+def encode_sync_token(issued_at):
+    """
+    Build an opaque sync token for a point in time.
+
+    Args:
+        issued_at: UTC datetime the sync snapshot was started at
+
+    Returns:
+        URL-safe string
+    """
+    return base64.urlsafe_b64encode(issued_at.isoformat().encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_sync_token(token):
+    """
+    Decode a token produced by encode_sync_token into the cutoff for the next delta.
+
+    Args:
+        token: Token string from the client
+
+    Returns:
+        UTC datetime; rows changed after it are included in the delta
+
+    Raises:
+        InvalidSyncToken: If the token is malformed
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        issued_at = datetime.fromisoformat(base64.urlsafe_b64decode(padded.encode('ascii')).decode('ascii'))
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidSyncToken('Invalid sync token')
+    return issued_at - timedelta(seconds=SYNC_OVERLAP_SECONDS)
+
+
+def record_tombstone(entity, entity_id, patient_id=None, user_id=None):
+    """
+    Record a deletion in the caller's transaction so it commits with the delete.
+
+    Args:
+        entity: 'patient', 'visit' or 'access'
+        entity_id: Primary key of the deleted row
+        patient_id: Patient the row belonged to
+        user_id: Grantee of a deleted access grant
+    """
+    db.session.add(SyncTombstone(
+        entity=entity,
+        entity_id=entity_id,
+        patient_id=patient_id,
+        user_id=user_id
+    ))
+
+
+def record_patient_tombstones(patient):
+    """
+    Record a patient deletion once per user who could see the patient (its
+    creator and everyone it was shared with), so sync only reports it to them.
+    Call before deleting the patient, while its access grants still exist.
+    
+    Args:
+        patient: Patient about to be deleted
+    """
+    audience = {patient.created_by}
+    audience.update(
+        user_id for (user_id,) in db.session.query(PatientAccess.user_id).filter(
+            PatientAccess.patient_id == patient.id
+        )
+    )
+    for user_id in audience:
+        record_tombstone('patient', patient.id, patient.id, user_id)
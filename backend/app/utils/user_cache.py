@@ -0,0 +1,49 @@
+from sqlalchemy.orm import make_transient_to_detached
+from app.models import db, User
+from app.utils.cache import TTLCache
+
+
+# Rows are cached as plain dicts rather than ORM instances, so each request
+# gets its own User object attached to its own session and writes to
+# current_user still persist normally.
+user_cache = TTLCache()
+
+
+def load_cached_user(user_id):
+    """
+    Flask-Login user loader backed by user_cache.
+
+    On a hit the User is rebuilt from cached values and attached to the
+    current session without a database round trip; on a miss it is loaded
+    normally and its column values are cached.
+
+    Args:
+        user_id: ID of the user (int)
+
+    Returns:
+        User instance or None
+    """
+    values = user_cache.get(user_id)
+    if values is not None:
+        user = User(**values)
+        make_transient_to_detached(user)
+        db.session.add(user)
+        return user
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        user_cache.set(user_id, {
+            attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs
+        })
+    return user
+
+
+def invalidate_user(user_id=None):
+    """
+    Invalidate cached identity after a user is changed or deleted.
+    Other gunicorn workers pick up the change once their entry's TTL expires.
+
+    Args:
+        user_id: ID of the user (defaults to all users)
+    """
+    user_cache.invalidate(user_id)
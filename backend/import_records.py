@@ -0,0 +1,97 @@
+"""
+Bulk Import Script
+Homeopathy Practice Management System
+
+Loads patients and visits from CSV or NDJSON files in a single transaction.
+Use it to onboard a clinic's existing records instead of creating patients
+one by one through the app.
+
+Patient files use the same field names as the patient form (full_name,
+date_of_birth as YYYY-MM-DD, gender, contact_number, ...) plus an optional
+`ref` column. Visit files name their patient with `patient_ref` (a ref from
+the patients file) or `patient_id` (an existing ID such as P-007).
+
+Usage:
+    python import_records.py --patients patients.csv --visits visits.csv --created-by admin
+"""
+
+import argparse
+import sys
+import os
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from app import create_app
+from app.models import User
+from app.utils.bulk_import import import_records, detect_format
+
+def main():
+    """Import patients and visits from files"""
+    
+    parser = argparse.ArgumentParser(description='Bulk import patients and visits')
+    parser.add_argument('--patients', help='CSV or NDJSON file of patients')
+    parser.add_argument('--visits', help='CSV or NDJSON file of visits')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], help='Input format (default: from file extension)')
+    parser.add_argument('--created-by', help='Username recorded as creator of the imported patients')
+    parser.add_argument('--skip-invalid', action='store_true', help='Commit valid rows even if some rows fail')
+    parser.add_argument('--dry-run', action='store_true', help='Validate everything, then roll back')
+    args = parser.parse_args()
+    
+    if not args.patients and not args.visits:
+        parser.error('pass --patients and/or --visits')
+    
+    print("=" * 50)
+    print("Bulk Import")
+    print("=" * 50)
+    
+    app = create_app()
+    
+    with app.app_context():
+        created_by = None
+        if args.created_by:
+            user = User.query.filter_by(username=args.created_by).first()
+            if not user:
+                print(f"\n❌ ERROR: User '{args.created_by}' not found")
+                sys.exit(1)
+            created_by = user.id
+        
+        patients_file = open(args.patients, 'rb') if args.patients else None
+        visits_file = open(args.visits, 'rb') if args.visits else None
+        try:
+            result = import_records(
+                patients=patients_file,
+                visits=visits_file,
+                patients_format=detect_format(args.patients, args.format) if args.patients else None,
+                visits_format=detect_format(args.visits, args.format) if args.visits else None,
+                created_by=created_by,
+                skip_invalid=args.skip_invalid,
+                dry_run=args.dry_run
+            )
+        except Exception as e:
+            print(f"\n❌ ERROR: Import failed: {str(e)}")
+            sys.exit(1)
+        finally:
+            for f in (patients_file, visits_file):
+                if f:
+                    f.close()
+        
+        for error in result['errors']:
+            print(f"   ✗ {error['file']} row {error['row']}: {error['error']}")
+        if result['error_count'] > len(result['errors']):
+            print(f"   ... and {result['error_count'] - len(result['errors'])} more errors")
+        
+        print(f"\n   Patients: {result['patients_created']}")
+        print(f"   Visits:   {result['visits_created']}")
+        print(f"   Errors:   {result['error_count']}")
+        
+        if result['dry_run']:
+            print("\n✅ DRY RUN COMPLETE (nothing was saved)")
+        elif result['committed']:
+            print("\n✅ IMPORT COMPLETED SUCCESSFULLY!")
+        else:
+            print("\n❌ Nothing was imported; fix the errors above or use --skip-invalid")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
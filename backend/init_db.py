@@ -14,6 +14,7 @@ sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
 
 from app import create_app
 from app.models import db, Settings
+from app.utils.rollups import rebuild_rollups
 
 def init_database():
     """Initialize database tables and default settings"""
@@ -51,6 +52,11 @@ def init_database():
                 # Settings are auto-initialized in app/__init__.py
                 print("   ✓ Default clinic name set: Gayatri Homeo Clinic")
             
+            # Backfill analytics rollups from existing visits and patients
+            print("\n5. Rebuilding analytics rollups...")
+            rebuild_rollups()
+            print("   ✓ Daily visit, complaint and patient rollups rebuilt")
+            
             print("\n" + "=" * 50)
             print("✅ DATABASE INITIALIZATION SUCCESSFUL!")
             print("=" * 50)
@@ -0,0 +1,40 @@
+"""
+Analytics Rollup Rebuild Script
+Homeopathy Practice Management System
+
+Recomputes the daily analytics rollup tables (visits, complaints and new
+patients per day) from the patients and visits tables. Empty rollups are
+backfilled automatically on startup; run this any time the dashboard looks
+out of sync.
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import app
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+from app import create_app
+from app.utils.rollups import rebuild_rollups
+
+def main():
+    """Rebuild all analytics rollup tables"""
+    
+    print("=" * 50)
+    print("Analytics Rollup Rebuild")
+    print("=" * 50)
+    
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            counts = rebuild_rollups()
+            for table, rows in counts.items():
+                print(f"   ✓ {table}: {rows} rows")
+            print("\n✅ ROLLUPS REBUILT SUCCESSFULLY!")
+        except Exception as e:
+            print(f"\n❌ ERROR: Rollup rebuild failed: {str(e)}")
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,8 @@
 from app import create_app
 
-app = create_app()
-
 if __name__ == '__main__':
+    # Built only when run directly: PDF render processes are spawned and
+    # re-import the main module, and must not create an app of their own.
+    # Production servers load wsgi:app instead.
+    app = create_app()
     app.run(debug=True, host='0.0.0.0', port=5000)
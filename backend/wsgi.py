@@ -0,0 +1,4 @@
+from app import create_app
+
+# WSGI entry point for production servers (gunicorn wsgi:app)
+app = create_app()
@@ -24,8 +24,8 @@ api.interceptors.response.use(
 );
 
 // Patients
-export const getPatients = (search = '', sortBy = 'name', order = 'asc') =>
-    api.get('/patients', { params: { search, sort_by: sortBy, order } });
+export const getPatients = (search = '', sortBy = 'name', order = 'asc', view = 'summary') =>
+    api.get('/patients', { params: { search, sort_by: sortBy, order, view } });
 
 export const getPatient = (id) => api.get(`/patients/${id}`);
 
@@ -44,18 +44,21 @@ export const createVisit = (patientId, data) => api.post(`/patients/${patientId}
 
 export const updateVisit = (id, data) => api.put(`/visits/${id}`, data);
 
+// Sync
+export const syncChanges = (since) => api.get('/sync', { params: since ? { since } : {} });
+
 // Analytics
 export const getDashboard = () => api.get('/analytics/dashboard');
 
 // Reports
 export const generatePatientReport = (patientId) =>
-    api.post(`/reports/patient/${patientId}`, {}, { responseType: 'blob' });
+    api.get(`/reports/patient/${patientId}`, { responseType: 'blob' });
 
 export const generateCertificate = (data) =>
     api.post('/reports/certificate', data, { responseType: 'blob' });
 
 export const generatePrescription = (visitId) =>
-    api.post(`/reports/prescription/${visitId}`, {}, { responseType: 'blob' });
+    api.get(`/reports/prescription/${visitId}`, { responseType: 'blob' });
 
 // Settings
 export const getSettings = () => api.get('/settings');